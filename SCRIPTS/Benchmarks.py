@@ -0,0 +1,271 @@
+"""
+Benchmark suite for the unmixing and charting pipeline
+Generates synthetic Sentinel-2-like band stacks and fraction/RMSE time
+series, times each stage and writes machine-readable JSON results
+
+Stages:
+- csv_load / csv_load_cached: load_data-style CSV parsing (cold and warm cache)
+  of --sites synthetic sites
+- merge: aligning dynamics and RMSE tables (site_table)
+- create_*: each GenerateCharts figure function, up to the point its outputs
+  are handed to the background encoder; every run starts from a fresh copy of
+  the data, no cached chart template and no pending exports; the figures
+  use the three chart sites
+- create_individual_site_charts[all]: the per-site charts of all --sites
+  synthetic sites, sharing one chart template as in GenerateCharts
+- savefig_png_300 / savefig_tiff_600 / savefig_png_tiff: one figure saved in
+  each format, and both saves as GenerateCharts used to write them
+- export_png_tiff: both outputs from one 600 dpi render (FigureExport),
+  waiting for the files; export_png_tiff_background: the time the plotting
+  thread waits with the default background encoding
+- endmembers / unmix_rmse: local unmixing of synthetic scenes
+- unmix_fcls_rmse: the same with fully constrained least squares
+
+Usage:
+    python Benchmarks.py --sites 3 --dates 65 --pixels 250000 --output bench.json
+    python Benchmarks.py --compare baseline.json --tolerance 1.2
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import FigureExport
+import GenerateCharts
+import LocalUnmixing
+from GenerateCharts import plt
+
+# Typical endmember spectra (B2, B3, B4, B8, B11, B12 reflectance)
+SYNTHETIC_ENDMEMBERS = np.array([
+    [0.12, 0.16, 0.22, 0.28, 0.38, 0.34],  # soil
+    [0.03, 0.07, 0.04, 0.42, 0.20, 0.10],  # veg
+    [0.02, 0.03, 0.03, 0.05, 0.04, 0.03],  # shadow
+]).T
+
+CHART_SITE_KEYS = ['narok', 'kajiado', 'turkana']
+
+
+def synthetic_band_stack(n_pixels, rng, noise=0.01):
+    """Band stack of shape (6, n_pixels) mixed from SYNTHETIC_ENDMEMBERS"""
+    fractions = rng.dirichlet([2.0, 2.0, 0.5], size=n_pixels).T
+    bands = SYNTHETIC_ENDMEMBERS @ fractions
+    bands += rng.normal(0, noise, bands.shape)
+    return np.clip(bands, 0, 1).astype(np.float32)
+
+
+def synthetic_site_series(n_dates, rng, start='2023-01-01', revisit_days=5):
+    """Fraction and RMSE tables in the DATA/ CSV layout for one site"""
+    dates = pd.date_range(start, periods=n_dates, freq=f'{revisit_days}D')
+    fractions = rng.dirichlet([2.0, 2.0, 0.5], size=n_dates)
+    dynamics = pd.DataFrame({'system:time_start': dates, 'Soil': fractions[:, 0],
+                             'Veg': fractions[:, 1], 'Shadow': fractions[:, 2]})
+    rmse = pd.DataFrame({'system:time_start': dates,
+                         'RMSE': rng.gamma(2.0, 0.025, size=n_dates)})
+    return dynamics, rmse
+
+
+def _gee_dates(dates):
+    return [f"{d:%b} {d.day}, {d.year}" for d in dates]
+
+
+def write_synthetic_csvs(data_dir, n_sites, n_dates, rng):
+    """Write dynamics and RMSE CSVs for n_sites; returns the paths"""
+    paths = []
+    for i in range(n_sites):
+        dynamics, rmse = synthetic_site_series(n_dates, rng)
+        for kind, table in (('Soil Veg and Shadow Dynamics', dynamics),
+                            ('Model Accuracy RMSE', rmse)):
+            table = table.copy()
+            table['system:time_start'] = _gee_dates(table['system:time_start'])
+            path = Path(data_dir) / f'Site{i:03d} {kind}.csv'
+            table.to_csv(path, index=False, float_format='%.3f')
+            paths.append(path)
+    return paths
+
+
+def time_stage(func, repeat, setup=None):
+    """
+    Run func repeat times; returns timing summary in seconds
+    setup: untimed call before each run whose return value is passed to
+    func, so every run starts from the same state
+    """
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times), 'repeat': repeat}
+
+
+def fresh_chart_state(data):
+    """
+    A copy of the chart data and no cached site-chart template, as at the
+    start of a GenerateCharts run (figure functions cache e.g. rmse_stats
+    in data and reuse the template across calls), with no exports of an
+    earlier run still being written
+    """
+    FigureExport.wait()
+    template = GenerateCharts._site_chart_template
+    if template is not None:
+        plt.close(template.fig)
+    GenerateCharts._site_chart_template = None
+    return dict(data)
+
+
+def run_benchmarks(n_sites=3, n_dates=65, n_pixels=250_000, n_scenes=3, repeat=3, seed=0):
+    """Run every stage and return the results dict"""
+    rng = np.random.default_rng(seed)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        data_dir, cache_dir, out_dir = tmp / 'DATA', tmp / 'cache', tmp / 'IMAGES'
+        data_dir.mkdir()
+        out_dir.mkdir()
+        paths = write_synthetic_csvs(data_dir, n_sites, n_dates, rng)
+
+        # CSV loading as in load_data (explicit parse, then warm cache)
+        results['csv_load'] = time_stage(
+            lambda: [GenerateCharts.read_timeseries(p, use_cache=False) for p in paths], repeat)
+        for p in paths:
+            GenerateCharts.read_timeseries(p, cache_dir=cache_dir)
+        results['csv_load_cached'] = time_stage(
+            lambda: [GenerateCharts.read_timeseries(p, cache_dir=cache_dir) for p in paths], repeat)
+
+        # Chart datasets: the first three synthetic sites under the chart keys
+        data = {}
+        for site_key in CHART_SITE_KEYS:
+            data[f'{site_key}_dynamics'], data[f'{site_key}_rmse'] = \
+                synthetic_site_series(n_dates, rng)
+
+        results['merge'] = time_stage(
+            lambda: [GenerateCharts.site_table(data, k) for k in CHART_SITE_KEYS], repeat)
+
+        # Figure functions write into the temporary output directory
+        original_output_dir = GenerateCharts.OUTPUT_DIR
+        GenerateCharts.OUTPUT_DIR = out_dir
+        try:
+            for task in GenerateCharts.figure_tasks():
+                name = task.func.__name__
+                if task.kwargs.get('sites'):
+                    name += f"[{task.kwargs['sites'][0][0]}]"
+                results[name] = time_stage(lambda fresh: task.func(fresh, **task.kwargs),
+                                           repeat, setup=lambda: fresh_chart_state(data))
+
+            # Per-site charts for all --sites synthetic sites in one call, as
+            # for a 30+ site deployment
+            site_data = dict(data)
+            sites = []
+            for i in range(n_sites):
+                site_key = f'site{i:03d}'
+                site_data[f'{site_key}_dynamics'], site_data[f'{site_key}_rmse'] = \
+                    synthetic_site_series(n_dates, rng)
+                sites.append((site_key, f'Site {i:03d}'))
+            results['create_individual_site_charts[all]'] = time_stage(
+                lambda fresh: GenerateCharts.create_individual_site_charts(fresh, sites=sites),
+                repeat, setup=lambda: fresh_chart_state(site_data))
+        finally:
+            FigureExport.wait()
+            GenerateCharts.OUTPUT_DIR = original_output_dir
+
+        # PNG vs TIFF encoding of the same figure
+        fig, ax = plt.subplots(figsize=(12, 10))
+        dynamics = data['narok_dynamics']
+        ax.plot(dynamics['system:time_start'], dynamics['Soil'], marker='o')
+        results['savefig_png_300'] = time_stage(
+            lambda: fig.savefig(out_dir / 'bench.png', dpi=300, bbox_inches='tight'), repeat)
+        results['savefig_tiff_600'] = time_stage(
+            lambda: fig.savefig(out_dir / 'bench.tiff', dpi=600, bbox_inches='tight'), repeat)
+        results['savefig_png_tiff'] = time_stage(
+            lambda: (fig.savefig(out_dir / 'bench.png', dpi=300, bbox_inches='tight'),
+                     fig.savefig(out_dir / 'bench.tiff', dpi=600, bbox_inches='tight')), repeat)
+        # Blocking export, and the time the plotting thread waits with the
+        # default background encoding (the files are written in between runs)
+        outputs = [(out_dir / 'bench.png', 300), (out_dir / 'bench.tiff', 600)]
+        results['export_png_tiff'] = time_stage(
+            lambda: FigureExport.export_figure(fig, outputs, background=False), repeat)
+        results['export_png_tiff_background'] = time_stage(
+            lambda _: FigureExport.export_figure(fig, outputs, background=True), repeat,
+            setup=FigureExport.wait)
+        FigureExport.wait()
+        plt.close(fig)
+
+    # Local unmixing plus RMSE
+    scenes = [synthetic_band_stack(n_pixels, rng) for _ in range(n_scenes)]
+    results['endmembers'] = time_stage(
+        lambda: LocalUnmixing.get_auto_endmembers(scenes[0]), repeat)
+    endmembers = LocalUnmixing.get_auto_endmembers(scenes[0])
+    results['unmix_rmse'] = time_stage(
+        lambda: [LocalUnmixing.process_scene(s, endmembers) for s in scenes], repeat)
+    results['unmix_fcls_rmse'] = time_stage(
+        lambda: [LocalUnmixing.process_scene(s, endmembers, 'fcls') for s in scenes], repeat)
+
+    return {
+        'config': {'sites': n_sites, 'dates': n_dates, 'pixels': n_pixels,
+                   'scenes': n_scenes, 'repeat': repeat, 'seed': seed},
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                        'pandas': pd.__version__, 'machine': platform.machine()},
+        'stages': results,
+    }
+
+
+def compare_results(current, baseline, tolerance=1.2):
+    """Stages whose min time exceeds baseline * tolerance: [(stage, old, new)]"""
+    regressions = []
+    for stage, timing in current['stages'].items():
+        old = baseline['stages'].get(stage)
+        if old and timing['min'] > old['min'] * tolerance:
+            regressions.append((stage, old['min'], timing['min']))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the unmixing and charting pipeline')
+    parser.add_argument('--sites', type=int, default=3,
+                        help='synthetic sites for CSV loading and the per-site charts')
+    parser.add_argument('--dates', type=int, default=65, help='observations per site')
+    parser.add_argument('--pixels', type=int, default=250_000, help='pixels per synthetic scene')
+    parser.add_argument('--scenes', type=int, default=3, help='scenes to unmix')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions per stage')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, default=None, help='write results JSON here')
+    parser.add_argument('--compare', type=Path, default=None, help='baseline results JSON')
+    parser.add_argument('--tolerance', type=float, default=1.2,
+                        help='slowdown factor that counts as a regression (default: 1.2)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmarks(args.sites, args.dates, args.pixels, args.scenes,
+                             args.repeat, args.seed)
+
+    for stage, timing in results['stages'].items():
+        print(f"{stage:<48} {timing['min'] * 1000:10.1f} ms")
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"✓ Saved: {args.output}")
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare_results(results, baseline, args.tolerance)
+        for stage, old, new in regressions:
+            print(f"✗ Regression: {stage} {old * 1000:.1f} ms -> {new * 1000:.1f} ms")
+        if regressions:
+            return 1
+        print("✓ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
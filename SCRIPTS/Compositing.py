@@ -0,0 +1,152 @@
+"""
+Temporal compositing and gap-filling onto regular date grids
+Turns the irregular, cloud-filtered scene dates kept by GEE_Script.js
+(CLOUDY_PIXEL_PERCENTAGE < 30 plus QA60 masking) into evenly spaced
+5-day, 10-day or monthly Soil/Veg/Shadow stacks
+
+Inputs:
+- Scenes as an iterable of (date, array) in date order; masked pixels are NaN.
+  Arrays can be any shape, e.g. (3, rows, cols) fraction stacks or (4,)
+  region means, and can be memmaps (one scene is read at a time).
+
+Methods:
+- 'linear': per-pixel linear interpolation between the valid observations
+  either side of each grid date (no extrapolation beyond the first/last)
+- 'median': per-pixel NaN-median of the scenes inside each grid interval
+
+Both walk the time axis once; memory is the output grid plus one scene
+(linear) or the scenes of one interval (median).
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+FREQUENCIES = {'5D': '5D', '10D': '10D', 'monthly': 'MS'}
+FRACTION_COLUMNS = ['Soil', 'Veg', 'Shadow']
+
+
+def regular_dates(start, end, freq='10D'):
+    """Regular grid of dates; freq is '5D', '10D', 'monthly' or any pandas alias"""
+    freq = FREQUENCIES.get(freq, freq)
+    start = pd.Timestamp(start).normalize()
+    if freq == 'MS':
+        # Monthly grids start on the first of the month so no scene falls before it
+        start = start.replace(day=1)
+    return pd.date_range(start, end, freq=freq)
+
+
+def _days(dates):
+    return (pd.DatetimeIndex(dates).to_numpy('datetime64[s]').astype(np.int64) / 86400.0)
+
+
+def interpolate_to_grid(scenes, grid, out=None):
+    """
+    Per-pixel linear gap-filling onto grid dates in a single pass
+    For every pixel the last valid (time, value) is kept; when the next
+    valid observation arrives, the grid dates between the two are filled.
+    """
+    grid_t = _days(grid)
+    prev_t = prev_v = None
+
+    for date, scene in scenes:
+        t = _days([date])[0]
+        scene = np.asarray(scene, dtype=np.float32)
+        if out is None:
+            out = np.full((len(grid_t),) + scene.shape, np.nan, dtype=np.float32)
+        if prev_t is None:
+            prev_t = np.full(scene.shape, np.nan)
+            prev_v = np.full(scene.shape, np.nan, dtype=np.float32)
+
+        valid = ~np.isnan(scene)
+        has_prev = valid & ~np.isnan(prev_t)
+
+        # Grid dates that can lie between a pixel's previous valid obs and t
+        earliest = np.nanmin(prev_t[has_prev]) if has_prev.any() else t
+        lo = np.searchsorted(grid_t, earliest, side='right')
+        hi = np.searchsorted(grid_t, t, side='right')
+        for g in range(lo, hi):
+            fill = has_prev & (prev_t < grid_t[g])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                w = (grid_t[g] - prev_t) / (t - prev_t)
+            out[g][fill] = (prev_v + w * (scene - prev_v))[fill]
+
+        # A grid date that coincides with the first valid observation
+        if hi > 0 and grid_t[hi - 1] == t:
+            exact = valid & ~has_prev
+            out[hi - 1][exact] = scene[exact]
+
+        prev_t = np.where(valid, t, prev_t)
+        prev_v = np.where(valid, scene, prev_v)
+
+    return out
+
+
+def composite_median(scenes, grid, out=None):
+    """
+    Per-pixel NaN-median of the scenes in each interval [grid[i], grid[i+1])
+    Scenes before grid[0] are ignored; the last interval is open-ended.
+    """
+    grid_t = _days(grid)
+    buffer, current = [], None
+
+    def flush():
+        if buffer and current >= 0:
+            # All-NaN pixels stay NaN without a warning per interval
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                out[current] = np.nanmedian(np.stack(buffer), axis=0)
+
+    for date, scene in scenes:
+        scene = np.asarray(scene, dtype=np.float32)
+        if out is None:
+            out = np.full((len(grid_t),) + scene.shape, np.nan, dtype=np.float32)
+        interval = np.searchsorted(grid_t, _days([date])[0], side='right') - 1
+        if interval != current:
+            flush()
+            buffer, current = [], interval
+        buffer.append(scene)
+    flush()
+
+    return out
+
+
+def composite(scenes, grid, method='linear', out=None):
+    if method == 'linear':
+        return interpolate_to_grid(scenes, grid, out)
+    if method == 'median':
+        return composite_median(scenes, grid, out)
+    raise ValueError(f"Unknown compositing method '{method}'")
+
+
+def renormalise_fractions(stack, axis=0):
+    """Rescale Soil/Veg/Shadow so they sum to one again (after median compositing)"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return stack / np.sum(stack, axis=axis, keepdims=True)
+
+
+def composite_table(table, freq='10D', method='linear', time_column='system:time_start'):
+    """
+    Regularise a site time series table (Soil/Veg/Shadow and/or RMSE)
+    Returns a table with one row per grid date (no rows for an empty table).
+    """
+    table = table.sort_values(time_column)
+    columns = [col for col in table.columns if col != time_column]
+    if table.empty:
+        out = pd.DataFrame({col: pd.Series(dtype=np.float64) for col in columns})
+        out.insert(0, time_column, pd.Series(dtype='datetime64[ns]'))
+        return out
+    dates = pd.DatetimeIndex(table[time_column])
+    grid = regular_dates(dates.min(), dates.max(), freq)
+
+    values = table[columns].to_numpy(dtype=np.float32)
+    result = composite(zip(dates, values), grid, method)
+
+    fraction_idx = [columns.index(col) for col in FRACTION_COLUMNS if col in columns]
+    if method == 'median' and len(fraction_idx) == len(FRACTION_COLUMNS):
+        result[:, fraction_idx] = renormalise_fractions(result[:, fraction_idx], axis=1)
+
+    out = pd.DataFrame(result.astype(np.float64), columns=columns)
+    out.insert(0, time_column, grid)
+    return out
@@ -0,0 +1,161 @@
+"""
+Schema-aware ingestion of raw GEE exports into one normalised table per site
+Replaces the manual header editing described in "Note in the CSV.md"
+
+Recognised schemas:
+- GEE chart export, raw:       system:time_start,Shadow,Soil,Veg  (labels permuted)
+- GEE table export with .geo:  system:index,Shadow,Soil,Veg,date,.geo  (labels permuted)
+- Already corrected:           system:time_start,Soil,Veg,Shadow
+- RMSE export:                 system:time_start,RMSE
+- Normalised (this module):    date,Soil,Veg,Shadow,RMSE  (ISO dates)
+
+Output:
+- One typed table per site: system:time_start (datetime), Soil, Veg, Shadow, RMSE
+"""
+
+import csv
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TIME_COLUMN = 'system:time_start'
+GEE_DATE_FORMAT = '%b %d, %Y'
+ISO_DATE_FORMAT = '%Y-%m-%d'
+VALUE_COLUMNS = ['Soil', 'Veg', 'Shadow', 'RMSE']
+
+# GEE writes the bands alphabetically with the wrong labels:
+# "Shadow" holds Soil, "Soil" holds Veg and "Veg" holds Shadow
+GEE_LABEL_FIX = {'Shadow': 'Soil', 'Soil': 'Veg', 'Veg': 'Shadow'}
+
+Schema = namedtuple('Schema', ['name', 'header', 'date_column', 'date_format', 'mapping'])
+
+SCHEMAS = [
+    Schema('gee_chart_raw', ['system:time_start', 'Shadow', 'Soil', 'Veg'],
+           TIME_COLUMN, GEE_DATE_FORMAT, GEE_LABEL_FIX),
+    Schema('gee_table_geo', ['system:index', 'Shadow', 'Soil', 'Veg', 'date', '.geo'],
+           'date', ISO_DATE_FORMAT, GEE_LABEL_FIX),
+    Schema('corrected', ['system:time_start', 'Soil', 'Veg', 'Shadow'],
+           TIME_COLUMN, GEE_DATE_FORMAT, {'Soil': 'Soil', 'Veg': 'Veg', 'Shadow': 'Shadow'}),
+    Schema('rmse', ['system:time_start', 'RMSE'],
+           TIME_COLUMN, GEE_DATE_FORMAT, {'RMSE': 'RMSE'}),
+    Schema('normalised', ['date'] + VALUE_COLUMNS,
+           'date', ISO_DATE_FORMAT, {col: col for col in VALUE_COLUMNS}),
+]
+
+# Filename suffixes stripped when deriving the site name
+_SITE_SUFFIXES = ['_TimeSeries_Data']
+
+# Per-site export names in the DATA/ layout; Narok's RMSE export has an underscore
+DYNAMICS_FILE = '{site} Soil Veg and Shadow Dynamics.csv'
+RMSE_FILE = '{site} Model Accuracy RMSE.csv'
+RMSE_FILE_OVERRIDES = {'Narok_Crops': 'Narok_Crops Model Accuracy_RMSE.csv'}
+
+
+def export_filenames(site):
+    """(dynamics, RMSE) CSV names of a site in the DATA/ layout"""
+    rmse = RMSE_FILE_OVERRIDES.get(site, RMSE_FILE.format(site=site))
+    return DYNAMICS_FILE.format(site=site), rmse
+
+
+def read_header(path):
+    """Read only the header row of a CSV"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f), [])
+
+
+def detect_schema(path):
+    """Identify a file's schema from its header row"""
+    header = read_header(path)
+    for schema in SCHEMAS:
+        if header == schema.header:
+            return schema
+    raise ValueError(f"{path}: unrecognised CSV header {header}")
+
+
+def site_from_filename(path):
+    """
+    Derive the site name from an export filename
+    "Narok_Crops Soil Veg and Shadow Dynamics.csv" -> "Narok_Crops"
+    "Narok_TimeSeries_Data.csv" -> "Narok"
+    """
+    site = Path(path).stem.split(' ')[0]
+    for suffix in _SITE_SUFFIXES:
+        if site.endswith(suffix):
+            site = site[:-len(suffix)]
+    return site
+
+
+def read_normalised(path, schema=None):
+    """
+    Read one export and return it with corrected labels and typed columns
+    Only the date and value columns are parsed; system:index and the
+    per-row .geo GeoJSON strings are never materialised.
+    """
+    if schema is None:
+        schema = detect_schema(path)
+
+    value_columns = list(schema.mapping)
+    df = pd.read_csv(path, usecols=[schema.date_column] + value_columns,
+                     dtype={col: np.float64 for col in value_columns})
+
+    table = pd.DataFrame({
+        TIME_COLUMN: pd.to_datetime(df[schema.date_column], format=schema.date_format)
+    })
+    for source, target in schema.mapping.items():
+        table[target] = df[source]
+
+    return table
+
+
+def _combine(frames):
+    """Align a site's frames on the time index; later files win on overlap"""
+    combined = None
+    for frame in frames:
+        frame = frame.drop_duplicates(TIME_COLUMN, keep='last').set_index(TIME_COLUMN)
+        combined = frame if combined is None else frame.combine_first(combined)
+
+    combined = combined.reindex(columns=VALUE_COLUMNS).sort_index()
+    return combined.reset_index()
+
+
+def ingest_files(paths, site_names=None):
+    """
+    Ingest many raw exports in a single pass
+    site_names: optional dict of path -> site overriding site_from_filename
+    Returns a dict of site -> normalised table.
+    """
+    site_names = site_names or {}
+    frames = {}
+
+    for path in paths:
+        path = Path(path)
+        site = site_names.get(path, site_from_filename(path))
+        frames.setdefault(site, []).append(read_normalised(path))
+
+    return {site: _combine(site_frames) for site, site_frames in sorted(frames.items())}
+
+
+def ingest_directory(input_dir, pattern='*.csv'):
+    """Ingest every export in a directory"""
+    return ingest_files(sorted(Path(input_dir).glob(pattern)))
+
+
+def write_normalised_tables(tables, output_dir):
+    """
+    Write each site's table as <site>.csv with an ISO 'date' column,
+    which GenerateCharts.read_timeseries reads directly
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+
+    for site, table in tables.items():
+        out = table.rename(columns={TIME_COLUMN: 'date'})
+        out['date'] = out['date'].dt.strftime(ISO_DATE_FORMAT)
+        path = output_dir / f'{site}.csv'
+        out.to_csv(path, index=False)
+        written.append(path)
+
+    return written
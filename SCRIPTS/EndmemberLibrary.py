@@ -0,0 +1,121 @@
+"""
+Persistent endmember library keyed by site geometry, date window and band set
+Saves re-running getAutoEndmembers (median composite + NDVI/BSI/brightness
+percentiles) for every site on every seasonal re-run, and keeps the exact
+spectra used so unmixing results are reproducible
+
+Each entry stores the soil/veg/shadow spectra (BAND_ORDER) and the p2/p98
+thresholds that selected them. The library is one JSON file with LRU
+eviction (max_entries) and explicit invalidation by key or site.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from LocalUnmixing import BAND_ORDER, get_auto_endmembers
+
+DEFAULT_MAX_ENTRIES = 1000
+SPECTRA = ['soil', 'veg', 'shadow']
+
+
+def library_key(site, geometry, start, end, bands=BAND_ORDER):
+    """
+    Stable key for an endmember set
+    geometry: anything JSON-serialisable identifying the region, e.g.
+    {'point': [35.95, -1.15], 'buffer': 2000} or a GeoJSON geometry
+    """
+    payload = json.dumps({'site': site, 'geometry': geometry, 'start': str(start),
+                          'end': str(end), 'bands': list(bands)}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+class EndmemberLibrary:
+    """JSON-backed endmember cache with LRU eviction"""
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.entries = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def save(self):
+        """Write the library atomically"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f'.{self.path.name}.tmp')
+        tmp.write_text(json.dumps(self.entries, indent=1, sort_keys=True))
+        os.replace(tmp, self.path)
+
+    def get(self, key):
+        """Endmember dict for key (as returned by get_auto_endmembers) or None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        entry['last_used'] = time.time()
+        endmembers = {name: np.asarray(entry[name], dtype=np.float64) for name in SPECTRA}
+        endmembers['thresholds'] = dict(entry['thresholds'])
+        return endmembers
+
+    def put(self, key, endmembers, site=None, geometry=None, start=None, end=None,
+            bands=BAND_ORDER):
+        """Store an endmember set, evicting least recently used entries if full"""
+        now = time.time()
+        entry = {name: np.asarray(endmembers[name], dtype=np.float64).tolist()
+                 for name in SPECTRA}
+        entry.update(thresholds=dict(endmembers.get('thresholds', {})),
+                     site=site, geometry=geometry, start=str(start), end=str(end),
+                     bands=list(bands), created=now, last_used=now)
+        self.entries[key] = entry
+        self._evict()
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            oldest = min(self.entries, key=lambda k: self.entries[k]['last_used'])
+            del self.entries[oldest]
+
+    def invalidate(self, key=None, site=None):
+        """Drop one entry, all entries of a site, or (no arguments) everything"""
+        if key is not None:
+            removed = [key] if self.entries.pop(key, None) is not None else []
+        elif site is not None:
+            removed = [k for k, e in self.entries.items() if e['site'] == site]
+            for k in removed:
+                del self.entries[k]
+        else:
+            removed = list(self.entries)
+            self.entries.clear()
+        return removed
+
+    def latest_for_site(self, site):
+        """Most recently created endmember set of a site, or None"""
+        keys = [k for k, e in self.entries.items() if e['site'] == site]
+        if not keys:
+            return None
+        return self.get(max(keys, key=lambda k: self.entries[k]['created']))
+
+    def endmembers_for(self, site, geometry, start, end, reference_image, save=True):
+        """
+        Endmembers for a site and date window, extracting them only on a miss
+        reference_image: the median composite array, or a callable returning
+        it, so the composite is only built when the library has no entry
+        """
+        key = library_key(site, geometry, start, end)
+        endmembers = self.get(key)
+        if endmembers is None:
+            image = reference_image() if callable(reference_image) else reference_image
+            endmembers = get_auto_endmembers(image)
+            self.put(key, endmembers, site, geometry, start, end)
+        if save:
+            self.save()
+        return endmembers
@@ -0,0 +1,277 @@
+"""
+Monte Carlo endmember uncertainty for the unmixed fractions
+The endmembers of getAutoEndmembers depend on arbitrary percentile
+cut-offs (p98 NDVI/BSI, p2 brightness); this propagates that choice into
+per-date confidence bands on Soil/Veg/Shadow/RMSE
+
+Inputs:
+- Reference image (median composite, (6, ...) in BAND_ORDER) for the draws
+- Scenes as (date, band stack) pairs
+
+Outputs:
+- K perturbed endmember sets of shape (K, bands, 3), drawn by jittering
+  the percentile cut-offs or by bootstrapping the p2/p98 pure pixels
+- Per-date region means of every set, summarised as the ensemble median
+  plus <col>_lo / <col>_hi percentile bands
+- "<Site> Endmember Uncertainty.csv" tables drawn as shaded bands by
+  GenerateCharts.py --uncertainty
+
+Draws are vectorised: pixels are sorted once per index and the mean
+spectrum for every cut-off comes from cumulative sums. Scenes are
+unmixed against all K sets at once: one pseudo-inverse per set (a single
+batched pinv call) and one (3K, bands) x (bands, pixels) product per
+pixel chunk, with RMSE from the expanded quadratic form so no per-set
+reconstruction is formed.
+
+Usage:
+    python EndmemberUncertainty.py --site Narok_Crops --reference composite.npy \\
+        --scenes SCENES --output UNCERTAINTY_DIR --draws 100
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from DataIngestion import ISO_DATE_FORMAT, TIME_COLUMN, VALUE_COLUMNS
+from LocalUnmixing import (BAND_ORDER, LOWER_PERCENTILE, UNMIX_METHODS, UPPER_PERCENTILE,
+                           process_scene, spectral_indices)
+from StreamingAppend import pending_scenes
+from TiledUnmixing import open_band_stack
+
+DEFAULT_DRAWS = 100
+CONFIDENCE = 95
+# Percentile cut-offs are drawn uniformly from these ranges
+UPPER_RANGE = (95.0, 99.5)
+LOWER_RANGE = (0.5, 5.0)
+DRAW_METHODS = ['percentile', 'bootstrap']
+# Upper bound on (sets x fractions x pixels) elements per chunk; small
+# chunks keep the per-set arrays in cache
+MAX_ENSEMBLE_ELEMENTS = 2 ** 19
+UNCERTAINTY_FILE = '{site} Endmember Uncertainty.csv'
+
+
+def _cutoff_means(pixels, key, thresholds, above):
+    """
+    Mean spectrum of the pixels with key above (or below) each threshold
+    Pixels are sorted by key once; every cut-off is a prefix of that order.
+    Returns an array of shape (len(thresholds), bands).
+    """
+    valid = ~np.isnan(key) & ~np.isnan(pixels).any(axis=0)
+    key, pixels = key[valid], pixels[:, valid]
+
+    ascending = np.argsort(key, kind='stable')
+    sorted_key = key[ascending]
+    if above:
+        counts = len(key) - np.searchsorted(sorted_key, thresholds, side='right')
+        order = ascending[::-1]
+    else:
+        counts = np.searchsorted(sorted_key, thresholds, side='left')
+        order = ascending
+    if (counts == 0).any():
+        raise ValueError("No pure pixels passed the percentile threshold")
+
+    cumulative = np.cumsum(pixels[:, order].astype(np.float64), axis=1)
+    return (cumulative[:, counts - 1] / counts).T
+
+
+def percentile_draws(image, n_draws=DEFAULT_DRAWS, rng=None,
+                     upper_range=UPPER_RANGE, lower_range=LOWER_RANGE):
+    """
+    Endmember sets from independently jittered cut-offs: BSI and NDVI
+    upper percentiles from upper_range, brightness lower from lower_range
+    """
+    rng = np.random.default_rng(rng)
+    image = np.asarray(image, dtype=np.float32)
+    pixels = image.reshape(len(BAND_ORDER), -1)
+    ndvi, bsi, brightness = (index.ravel() for index in spectral_indices(image))
+
+    soil = _cutoff_means(pixels, bsi, np.nanpercentile(
+        bsi, rng.uniform(*upper_range, n_draws)), above=True)
+    veg = _cutoff_means(pixels, ndvi, np.nanpercentile(
+        ndvi, rng.uniform(*upper_range, n_draws)), above=True)
+    shadow = _cutoff_means(pixels, brightness, np.nanpercentile(
+        brightness, rng.uniform(*lower_range, n_draws)), above=False)
+
+    return np.stack([soil, veg, shadow], axis=-1)
+
+
+def bootstrap_draws(image, n_draws=DEFAULT_DRAWS, rng=None):
+    """
+    Endmember sets from resampling, with replacement, the pure pixels
+    selected by the fixed p2/p98 cut-offs of getAutoEndmembers
+    """
+    rng = np.random.default_rng(rng)
+    image = np.asarray(image, dtype=np.float32)
+    pixels = image.reshape(len(BAND_ORDER), -1)
+    ndvi, bsi, brightness = (index.ravel() for index in spectral_indices(image))
+
+    def resampled_means(selected):
+        selected &= ~np.isnan(pixels).any(axis=0)
+        pure = pixels[:, selected].astype(np.float64)
+        n_pure = pure.shape[1]
+        if not n_pure:
+            raise ValueError("No pure pixels passed the percentile threshold")
+        # Resample counts per pixel; each draw's mean is one weighted sum
+        weights = rng.multinomial(n_pure, np.full(n_pure, 1.0 / n_pure), size=n_draws)
+        return weights @ pure.T / n_pure
+
+    with np.errstate(invalid='ignore'):
+        soil = resampled_means(bsi > np.nanpercentile(bsi, UPPER_PERCENTILE))
+        veg = resampled_means(ndvi > np.nanpercentile(ndvi, UPPER_PERCENTILE))
+        shadow = resampled_means(brightness < np.nanpercentile(brightness, LOWER_PERCENTILE))
+
+    return np.stack([soil, veg, shadow], axis=-1)
+
+
+def draw_endmember_sets(image, n_draws=DEFAULT_DRAWS, method='percentile', rng=None):
+    """K perturbed endmember sets, shape (K, bands, 3) in FRACTION_NAMES order"""
+    if method == 'percentile':
+        return percentile_draws(image, n_draws, rng)
+    if method == 'bootstrap':
+        return bootstrap_draws(image, n_draws, rng)
+    raise ValueError(f"Unknown draw method '{method}'")
+
+
+def ensemble_region_means(bands, endmember_sets, method='gee', chunk_pixels=None):
+    """
+    Region-mean Soil/Veg/Shadow/RMSE of one scene for every endmember set
+    'gee': all sets are solved together, clamped and normalised per set
+    'fcls': LocalUnmixing.unmix_fcls per set (its solver is cached per set)
+    Returns an array of shape (K, 4) in VALUE_COLUMNS order.
+    """
+    sets = np.asarray(endmember_sets, dtype=np.float64)
+    bands = np.asarray(bands, dtype=np.float32)
+
+    if method == 'fcls':
+        means = []
+        for matrix in sets:
+            result = process_scene(bands, matrix, 'fcls')
+            means.append([np.nanmean(result[name]) for name in VALUE_COLUMNS])
+        return np.array(means)
+    if method != 'gee':
+        raise ValueError(f"Unknown unmixing method '{method}'")
+
+    pixels = bands.reshape(bands.shape[0], -1)
+    n_sets, n_bands, n_fractions = sets.shape
+    if chunk_pixels is None:
+        chunk_pixels = max(1, MAX_ENSEMBLE_ELEMENTS // (n_sets * n_fractions))
+
+    # One factorisation per set (a single batched pinv call), stacked so a
+    # pixel chunk is unmixed against every set in one matrix product
+    pinv = np.linalg.pinv(sets).reshape(n_sets * n_fractions, n_bands).astype(np.float32)
+    transposed = sets.transpose(0, 2, 1).reshape(n_sets * n_fractions, n_bands)
+    transposed = transposed.astype(np.float32)
+    gram = np.matmul(sets.transpose(0, 2, 1), sets).astype(np.float32)
+
+    sums = np.zeros((n_sets, len(VALUE_COLUMNS)))
+    counts = np.zeros(n_sets)
+    for start in range(0, pixels.shape[1], chunk_pixels):
+        x = pixels[:, start:start + chunk_pixels]
+        finite = ~np.isnan(x).any(axis=0)
+        if not finite.all():
+            x = np.where(finite, x, 0)
+
+        unmixed = np.maximum(pinv @ x, 0).reshape(n_sets, n_fractions, -1)
+        total = unmixed.sum(axis=1)
+        # Pixels whose clamped fractions sum to zero are masked, as in GEE
+        valid = (total > 0) & finite
+        scale = np.divide(1, total, out=np.zeros_like(total), where=valid)
+        sums[:, :n_fractions] += np.matmul(unmixed, scale[:, :, None])[:, :, 0]
+
+        # With f = u * scale and scale * total = 1:
+        # ||x - E f||^2 = x'x + scale^2 (u'E'E u - 2 total u'E'x)
+        # so the reconstruction E f is never formed per set
+        projected = (transposed @ x).reshape(n_sets, n_fractions, -1)
+        quadratic = np.matmul(gram, unmixed)
+        quadratic -= 2 * total[:, None] * projected
+        squared = (x * x).sum(axis=0) + scale * scale * np.einsum(
+            'kip,kip->kp', unmixed, quadratic)
+        rmse = np.sqrt(np.maximum(squared, 0) / n_bands)
+        sums[:, n_fractions] += np.einsum('kp,kp->k', rmse, valid.astype(np.float32))
+        counts += valid.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sums / counts[:, None]
+
+
+def summarise_ensemble(means, confidence=CONFIDENCE):
+    """Ensemble median and central confidence band of (K, 4) region means"""
+    tail = (100 - confidence) / 2
+    lo, median, hi = np.nanpercentile(means, [tail, 50, 100 - tail], axis=0)
+    row = dict(zip(VALUE_COLUMNS, median))
+    row.update({f'{col}_lo': value for col, value in zip(VALUE_COLUMNS, lo)})
+    row.update({f'{col}_hi': value for col, value in zip(VALUE_COLUMNS, hi)})
+    return row
+
+
+def scene_uncertainty(scenes, endmember_sets, method='gee', confidence=CONFIDENCE):
+    """
+    Per-date confidence bands for a site
+    scenes: iterable of (date, band stack)
+    Returns a table with system:time_start, the ensemble median of each
+    column and <col>_lo / <col>_hi bands.
+    """
+    rows = []
+    for date, bands in scenes:
+        means = ensemble_region_means(bands, endmember_sets, method)
+        rows.append({TIME_COLUMN: pd.Timestamp(date), **summarise_ensemble(means, confidence)})
+
+    columns = [TIME_COLUMN] + VALUE_COLUMNS + [f'{col}_{side}' for col in VALUE_COLUMNS
+                                               for side in ('lo', 'hi')]
+    table = pd.DataFrame(rows, columns=columns)
+    table[TIME_COLUMN] = pd.to_datetime(table[TIME_COLUMN])
+    return table.sort_values(TIME_COLUMN, ignore_index=True)
+
+
+def write_uncertainty_csv(table, output_dir, site):
+    """Write a site's bands with an ISO 'date' column for GenerateCharts"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    out = table.rename(columns={TIME_COLUMN: 'date'})
+    out['date'] = out['date'].dt.strftime(ISO_DATE_FORMAT)
+    path = output_dir / UNCERTAINTY_FILE.format(site=site)
+    out.to_csv(path, index=False, float_format='%.5f')
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--site', required=True, help='site name, e.g. Narok_Crops')
+    parser.add_argument('--reference', type=Path, required=True,
+                        help='median composite (.npy, (6, rows, cols)) to draw endmembers from')
+    parser.add_argument('--scenes', type=Path, required=True,
+                        help='directory of scenes, <Site>/<YYYY-MM-DD>.npy')
+    parser.add_argument('--output', type=Path, required=True,
+                        help="directory for '<Site> Endmember Uncertainty.csv'")
+    parser.add_argument('--draws', type=int, default=DEFAULT_DRAWS,
+                        help=f'number of perturbed endmember sets (default: {DEFAULT_DRAWS})')
+    parser.add_argument('--draw-method', choices=DRAW_METHODS, default='percentile',
+                        help='jitter the percentile cut-offs or bootstrap the pure pixels')
+    parser.add_argument('--method', choices=UNMIX_METHODS, default='gee',
+                        help='unmixing method (default: gee)')
+    parser.add_argument('--confidence', type=float, default=CONFIDENCE,
+                        help=f'central interval in percent (default: {CONFIDENCE})')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sets = draw_endmember_sets(open_band_stack(args.reference), args.draws,
+                               args.draw_method, rng=args.seed)
+    scenes = ((date, open_band_stack(path))
+              for date, path in pending_scenes(args.scenes, args.site))
+    table = scene_uncertainty(scenes, sets, args.method, args.confidence)
+    if table.empty:
+        print(f"✗ No scenes for {args.site} in {args.scenes}")
+        return 1
+    path = write_uncertainty_csv(table, args.output, args.site)
+    print(f"✓ Saved: {path} ({len(table)} dates, {args.draws} endmember sets)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Single-render export of publication figures
+Renders a figure once at the highest requested DPI and derives the
+lower-DPI outputs by resampling, instead of a full savefig per output
+
+Inputs:
+- A matplotlib figure and a list of (path, dpi) outputs (.png, .tif/.tiff)
+
+Outputs:
+- The highest-DPI output is the rendered raster itself; lower DPIs are
+  box-filtered reductions of it (Image.reduce for integer ratios)
+- TIFFs with lossless compression (Deflate by default, or LZW), instead
+  of the uncompressed multi-hundred-MB rasters savefig writes
+- PNGs at a fast Deflate level (PNG_COMPRESS_LEVEL)
+
+Encoding runs on a small thread pool (Pillow releases the GIL while
+encoding), so the outputs of a figure are written concurrently. By default
+(background=True) export_figure returns once the figure is rasterised and
+the next figure is plotted while the files are written; call wait()
+before exiting.
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+from PIL import Image
+
+import Instrumentation
+
+TIFF_COMPRESSIONS = ['tiff_adobe_deflate', 'tiff_lzw', 'raw']
+TIFF_COMPRESSION = 'tiff_adobe_deflate'
+ENCODER_THREADS = 2
+PNG_COMPRESS_LEVEL = 1  # ~25% larger files than level 6, encoded 20-25% faster
+
+_settings = {'background': True, 'tiff_compression': TIFF_COMPRESSION}
+_executor = None
+_pending = []
+
+
+def configure(background=True, tiff_compression=TIFF_COMPRESSION):
+    """Set the default export mode (call again in worker processes)"""
+    if tiff_compression not in TIFF_COMPRESSIONS:
+        raise ValueError(f"Unknown TIFF compression '{tiff_compression}'")
+    _settings.update(background=background, tiff_compression=tiff_compression)
+    return dict(_settings)
+
+
+def settings():
+    """Current configuration, to pass to configure() in worker processes"""
+    return dict(_settings)
+
+
+def _encoder():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=ENCODER_THREADS,
+                                       thread_name_prefix='figure-export')
+    return _executor
+
+
+def rasterise(fig, dpi):
+    """Render a figure once into an in-memory image (RGB if fully opaque)"""
+    # Resolve the tight bounding box here so the pixel size of the raw
+    # buffer is known: int(width * dpi) x int(height * dpi), as in Agg
+    renderer = fig.canvas.get_renderer()
+    bbox = fig.get_tightbbox(renderer).padded(plt.rcParams['savefig.pad_inches'])
+    size = (int(bbox.width * dpi), int(bbox.height * dpi))
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='rgba', dpi=dpi, bbox_inches=bbox)
+    image = Image.frombuffer('RGBA', size, buffer.getbuffer(), 'raw', 'RGBA', 0, 1)
+    if image.getchannel('A').getextrema() == (255, 255):
+        return image.convert('RGB')
+    return image.copy()
+
+
+def resample(image, factor):
+    """Shrink an image by factor (>= 1); integer factors use a box filter"""
+    if factor == 1:
+        return image
+    if float(factor).is_integer():
+        return image.reduce(int(factor))
+    size = (max(1, round(image.width / factor)), max(1, round(image.height / factor)))
+    return image.resize(size, Image.Resampling.LANCZOS)
+
+
+def _write(image, path, dpi, source_dpi, tiff_compression):
+    with Instrumentation.span(f'encode {path.name}', category='encode', dpi=dpi):
+        image = resample(image, source_dpi / dpi)
+        if path.suffix.lower() in ('.tif', '.tiff'):
+            image.save(path, dpi=(dpi, dpi), compression=tiff_compression)
+        else:
+            image.save(path, dpi=(dpi, dpi), compress_level=PNG_COMPRESS_LEVEL)
+    print(f"✓ Saved: {path}")
+    return path
+
+
+def export_figure(fig, outputs, background=None):
+    """
+    Write a figure to several (path, dpi) outputs from a single render
+    background: return without waiting for the files (default: configure())
+    Returns the written paths, or the pending futures in background mode.
+    """
+    outputs = [(Path(path), dpi) for path, dpi in outputs]
+    source_dpi = max(dpi for _, dpi in outputs)
+    image = rasterise(fig, source_dpi)
+
+    futures = [_encoder().submit(_write, image, path, dpi, source_dpi,
+                                 _settings['tiff_compression'])
+               for path, dpi in outputs]
+
+    if background is None:
+        background = _settings['background']
+    if background:
+        _pending.extend(futures)
+        return futures
+    return [future.result() for future in futures]
+
+
+def wait():
+    """Block until all background exports are written; re-raises their errors"""
+    paths = []
+    while _pending:
+        paths.append(_pending.pop(0).result())
+    return paths
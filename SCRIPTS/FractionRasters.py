@@ -0,0 +1,158 @@
+"""
+Chunked, compressed per-scene Soil/Veg/Shadow/RMSE rasters with overviews
+Keeps the pixel-level output of the local pipeline instead of reducing each
+scene to one ee.Reducer.mean() value
+
+Layout (Zarr-like, one directory per scene):
+    <root>/<site>/<YYYYMMDD>/meta.json
+    <root>/<site>/<YYYYMMDD>/<level>/<name>/<row>.<col>   zlib-compressed chunk
+
+Level 0 is full resolution; each further level halves both dimensions
+(NaN-aware 2 x 2 mean) until the raster fits in a single chunk. Readers
+only decompress the chunks overlapping the requested window and level.
+"""
+
+import json
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RASTER_NAMES = ['Soil', 'Veg', 'Shadow', 'RMSE']
+DEFAULT_CHUNK = 512
+COMPRESSION_LEVEL = 4
+
+
+def scene_path(root, site, date):
+    return Path(root) / site / pd.Timestamp(date).strftime('%Y%m%d')
+
+
+def _chunk_path(path, level, name, row, col):
+    return path / str(level) / name / f'{row}.{col}'
+
+
+def _write_chunk(file_path, chunk):
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    chunk = np.ascontiguousarray(chunk, dtype=np.float32)
+    file_path.write_bytes(zlib.compress(chunk.tobytes(), COMPRESSION_LEVEL))
+
+
+def _read_chunk(file_path, shape):
+    return np.frombuffer(zlib.decompress(file_path.read_bytes()),
+                         dtype=np.float32).reshape(shape)
+
+
+def load_meta(path):
+    return json.loads((Path(path) / 'meta.json').read_text())
+
+
+def _level_shapes(shape, chunk):
+    shapes = [tuple(shape)]
+    while max(shapes[-1]) > chunk:
+        rows, cols = shapes[-1]
+        shapes.append(((rows + 1) // 2, (cols + 1) // 2))
+    return shapes
+
+
+def read_window(path, name, level=0, window=None):
+    """
+    Read a window of one raster at one level
+    window: (row_slice, col_slice) in that level's pixel grid (whole raster by default)
+    """
+    path = Path(path)
+    meta = load_meta(path)
+    chunk = meta['chunk']
+    rows, cols = meta['levels'][level]
+    if window is None:
+        window = (slice(0, rows), slice(0, cols))
+    r0, r1, _ = window[0].indices(rows)
+    c0, c1, _ = window[1].indices(cols)
+
+    out = np.empty((r1 - r0, c1 - c0), dtype=np.float32)
+    for cr in range(r0 // chunk, (r1 - 1) // chunk + 1):
+        for cc in range(c0 // chunk, (c1 - 1) // chunk + 1):
+            top, left = cr * chunk, cc * chunk
+            shape = (min(chunk, rows - top), min(chunk, cols - left))
+            data = _read_chunk(_chunk_path(path, level, name, cr, cc), shape)
+            rs = slice(max(r0, top), min(r1, top + shape[0]))
+            cs = slice(max(c0, left), min(c1, left + shape[1]))
+            out[rs.start - r0:rs.stop - r0, cs.start - c0:cs.stop - c0] = \
+                data[rs.start - top:rs.stop - top, cs.start - left:cs.stop - left]
+    return out
+
+
+def _downsample(block):
+    """NaN-aware 2 x 2 mean (odd edges are padded with NaN)"""
+    rows, cols = block.shape
+    padded = np.full((rows + rows % 2, cols + cols % 2), np.nan, dtype=np.float32)
+    padded[:rows, :cols] = block
+    quads = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+    with np.errstate(invalid='ignore'):
+        valid = (~np.isnan(quads)).sum(axis=(1, 3))
+        total = np.nansum(quads, axis=(1, 3))
+        return np.where(valid > 0, total / np.maximum(valid, 1), np.nan).astype(np.float32)
+
+
+def write_scene(root, site, date, rasters, chunk=DEFAULT_CHUNK):
+    """
+    Store one scene's rasters (dict of name -> 2-D array or memmap)
+    Level 0 is written chunk by chunk; each overview is built from the
+    level below one chunk at a time, so memory stays bounded by chunk size.
+    """
+    path = scene_path(root, site, date)
+    names = [name for name in RASTER_NAMES if name in rasters]
+    shape = next(iter(rasters.values())).shape
+    levels = _level_shapes(shape, chunk)
+
+    for name in names:
+        raster = rasters[name]
+        for top in range(0, shape[0], chunk):
+            for left in range(0, shape[1], chunk):
+                _write_chunk(_chunk_path(path, 0, name, top // chunk, left // chunk),
+                             raster[top:top + chunk, left:left + chunk])
+
+    meta = {'site': site, 'date': pd.Timestamp(date).strftime('%Y-%m-%d'),
+            'names': names, 'chunk': chunk, 'dtype': 'float32',
+            'compression': 'zlib', 'levels': [list(levels[0])]}
+    (path / 'meta.json').write_text(json.dumps(meta))
+
+    for level in range(1, len(levels)):
+        rows, cols = levels[level]
+        for name in names:
+            for top in range(0, rows, chunk):
+                for left in range(0, cols, chunk):
+                    window = (slice(2 * top, 2 * (top + chunk)),
+                              slice(2 * left, 2 * (left + chunk)))
+                    block = read_window(path, name, level - 1, window)
+                    _write_chunk(_chunk_path(path, level, name, top // chunk, left // chunk),
+                                 _downsample(block))
+        # Record the level only once it is complete
+        meta['levels'].append([rows, cols])
+        (path / 'meta.json').write_text(json.dumps(meta))
+
+    return path
+
+
+def list_scenes(root, site):
+    """Dates with stored rasters for a site"""
+    site_dir = Path(root) / site
+    return sorted(pd.Timestamp(p.name) for p in site_dir.iterdir()
+                  if (p / 'meta.json').exists()) if site_dir.exists() else []
+
+
+def choose_level(meta, target_pixels):
+    """
+    Coarsest overview level that still has at least target_pixels along
+    its longer side (level 0 if even that is smaller)
+    """
+    for level in range(len(meta['levels']) - 1, -1, -1):
+        if max(meta['levels'][level]) >= target_pixels:
+            return level
+    return 0
+
+
+def read_for_display(path, name, target_pixels):
+    """Read the whole raster from the overview level suited to target_pixels"""
+    level = choose_level(load_meta(path), target_pixels)
+    return read_window(path, name, level), level
@@ -0,0 +1,163 @@
+"""
+Consolidated columnar store for Soil/Veg/Shadow/RMSE time series
+Replaces the per-site "<Site> Soil Veg and Shadow Dynamics.csv" and
+"<Site> Model Accuracy RMSE.csv" pairs with one dataset aligned on time
+
+Layout (one .npy file per column, memory-mapped on read):
+    <store>/site=<Site>/year=<YYYY>/system_time_start.npy
+    <store>/site=<Site>/year=<YYYY>/Soil.npy, Veg.npy, Shadow.npy, RMSE.npy
+
+Reads prune partitions by site and year from directory names, then slice
+the sorted time column with a binary search, so only the requested rows
+of the requested columns are read.
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from DataIngestion import TIME_COLUMN, VALUE_COLUMNS, ingest_files
+
+TIME_FILE = 'system_time_start.npy'
+
+
+def partition_path(store_dir, site, year):
+    return Path(store_dir) / f'site={site}' / f'year={year}'
+
+
+def _read_partition(path, columns=None, mmap=True):
+    """Read one partition as a dict of column arrays (memory-mapped by default)"""
+    mode = 'r' if mmap else None
+    table = {TIME_COLUMN: np.load(path / TIME_FILE, mmap_mode=mode)}
+    for col in columns or VALUE_COLUMNS:
+        table[col] = np.load(path / f'{col}.npy', mmap_mode=mode)
+    return table
+
+
+def _write_partition(path, table):
+    """Write a partition's columns, replacing files atomically"""
+    path.mkdir(parents=True, exist_ok=True)
+    arrays = {TIME_FILE: table[TIME_COLUMN].to_numpy()}
+    for col in VALUE_COLUMNS:
+        arrays[f'{col}.npy'] = table[col].to_numpy(dtype=np.float64)
+
+    for filename, array in arrays.items():
+        tmp = path / f'.{filename}.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, path / filename)
+
+
+def write_site_table(store_dir, site, table):
+    """
+    Upsert a normalised site table (DataIngestion format) into the store
+    Rows are split by year; dates already stored are overwritten.
+    """
+    table = table.sort_values(TIME_COLUMN)
+    for year, rows in table.groupby(table[TIME_COLUMN].dt.year):
+        path = partition_path(store_dir, site, year)
+        if (path / TIME_FILE).exists():
+            existing = pd.DataFrame(_read_partition(path, mmap=False))
+            rows = pd.concat([existing, rows]).drop_duplicates(TIME_COLUMN, keep='last')
+            rows = rows.sort_values(TIME_COLUMN)
+        _write_partition(path, rows.reindex(columns=[TIME_COLUMN] + VALUE_COLUMNS))
+
+
+def build_store(paths, store_dir):
+    """Ingest raw or per-site CSV exports and write them into the store"""
+    tables = ingest_files(paths)
+    for site, table in tables.items():
+        write_site_table(store_dir, site, table)
+    return sorted(tables)
+
+
+def list_sites(store_dir):
+    return sorted(p.name.split('=', 1)[1] for p in Path(store_dir).glob('site=*'))
+
+
+def list_partitions(store_dir, sites=None, start=None, end=None):
+    """
+    Partitions matching the site and date-range predicates, pruned by
+    directory name only. Returns a sorted list of (site, year, path).
+    """
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    sites = set(sites) if sites is not None else None
+
+    partitions = []
+    for site_dir in Path(store_dir).glob('site=*'):
+        site = site_dir.name.split('=', 1)[1]
+        if sites is not None and site not in sites:
+            continue
+        for year_dir in site_dir.glob('year=*'):
+            year = int(year_dir.name.split('=', 1)[1])
+            if start is not None and year < start.year:
+                continue
+            if end is not None and year > end.year:
+                continue
+            partitions.append((site, year, year_dir))
+
+    return sorted(partitions)
+
+
+def last_time(store_dir, site):
+    """
+    Latest system:time_start stored for a site, or None for a new site
+    Only the time column of the newest year partition is read.
+    """
+    for _, _, path in reversed(list_partitions(store_dir, [site])):
+        times = np.load(path / TIME_FILE, mmap_mode='r')
+        if len(times):
+            return pd.Timestamp(times[-1])
+    return None
+
+
+def _empty_table(columns=None):
+    """Typed table with no rows: datetime time column, float value columns"""
+    table = pd.DataFrame({TIME_COLUMN: pd.Series(dtype='datetime64[ns]')})
+    for col in columns or VALUE_COLUMNS:
+        table[col] = pd.Series(dtype=np.float64)
+    return table
+
+
+def iter_store(store_dir, sites=None, start=None, end=None, columns=None):
+    """
+    Stream matching rows one partition at a time as (site, DataFrame)
+    Only the rows inside [start, end] of the requested columns are copied
+    out of the memory-mapped files.
+    """
+    columns = list(columns or VALUE_COLUMNS)
+    for site, year, path in list_partitions(store_dir, sites, start, end):
+        table = _read_partition(path, columns)
+        times = table[TIME_COLUMN]
+
+        lo = 0 if start is None else np.searchsorted(times, np.datetime64(pd.Timestamp(start)), 'left')
+        hi = len(times) if end is None else np.searchsorted(times, np.datetime64(pd.Timestamp(end)), 'right')
+        if hi <= lo:
+            continue
+
+        yield site, pd.DataFrame({col: np.array(table[col][lo:hi]) for col in table})
+
+
+def read_store(store_dir, sites=None, start=None, end=None, columns=None):
+    """Read matching rows into one DataFrame with a 'site' column"""
+    frames = []
+    for site, frame in iter_store(store_dir, sites, start, end, columns):
+        frame.insert(0, 'site', site)
+        frames.append(frame)
+
+    if not frames:
+        table = _empty_table(columns)
+        table.insert(0, 'site', pd.Series(dtype=object))
+        return table
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_site(store_dir, site, start=None, end=None, columns=None):
+    """Read one site's aligned time series"""
+    frames = [frame for _, frame in iter_store(store_dir, [site], start, end, columns)]
+    if not frames:
+        return _empty_table(columns)
+    return pd.concat(frames, ignore_index=True)
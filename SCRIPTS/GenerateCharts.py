@@ -14,15 +14,34 @@ Outputs:
 - Additional individual site charts
 """
 
+import argparse
+import hashlib
+import inspect
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend for Windows
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.patches import Rectangle
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from pathlib import Path
 import numpy as np
 
+import Compositing
+import EndmemberUncertainty
+import FigureExport
+import FractionRasters
+import FractionStore
+import Instrumentation
+from DataIngestion import export_filenames
+from SiteStatistics import StatisticsIndex, source_key
+
 # Set publication-quality defaults
 plt.rcParams['figure.dpi'] = 300
 plt.rcParams['savefig.dpi'] = 300
@@ -39,42 +58,263 @@ DATA_DIR = SCRIPT_DIR / 'DATA'
 OUTPUT_DIR = SCRIPT_DIR / 'IMAGES'
 OUTPUT_DIR.mkdir(exist_ok=True)
 
+# Sites with individual detailed charts
+INDIVIDUAL_SITES = [
+    ('narok', 'Narok Agricultural Cropland'),
+    ('kajiado', 'Kajiado Acacia Shrubland'),
+    ('turkana', 'Turkana Arid Rangeland')
+]
+
+
+# Site names in the DATA/ exports and the consolidated store (FractionStore.py)
+SITE_NAMES = {
+    'narok': 'Narok_Crops',
+    'kajiado': 'Kajiado_Shrub',
+    'turkana': 'Turkana_Bare',
+}
+
+# Input CSVs keyed by dataset name
+DATA_FILES = {
+    f'{site_key}_{kind}': filename
+    for site_key, site in SITE_NAMES.items()
+    for kind, filename in zip(['dynamics', 'rmse'], export_filenames(site))
+}
+
+# Decimation buckets: widest figure (16 in) at the highest save DPI (600),
+# i.e. about one min/max pair per output pixel column
+DECIMATE_BUCKETS = 16 * 600
+
+# Manifest of figure fingerprints for incremental builds
+MANIFEST_NAME = '.figure_manifest.json'
+# Content digests of input files, keyed by path and reused while size and mtime match
+DIGEST_CACHE_NAME = '.input_digests.json'
+
+# Date formats: GEE chart exports ("Jan 1, 2023") and GEE table exports (ISO "date")
+TIME_COLUMN = 'system:time_start'
+GEE_DATE_FORMAT = '%b %d, %Y'
+ISO_DATE_COLUMN = 'date'
+ISO_DATE_FORMAT = '%Y-%m-%d'
+
+# Binary cache of parsed CSVs (one structured .npy per CSV and content hash)
+CACHE_DIR = DATA_DIR / '.cache'
+
+# Legend label of the shaded endmember-uncertainty bands (--uncertainty)
+UNCERTAINTY_LABEL = 'Endmember uncertainty'
+
+
+def parse_timeseries_csv(path):
+    """
+    Read a time series CSV and parse its dates with an explicit format
+    Accepts the GEE chart export column 'system:time_start' ("Jan 1, 2023")
+    or an ISO 'date' column, which is renamed to 'system:time_start'.
+    """
+    df = pd.read_csv(path)
+    
+    if TIME_COLUMN in df.columns:
+        df[TIME_COLUMN] = pd.to_datetime(df[TIME_COLUMN], format=GEE_DATE_FORMAT)
+    elif ISO_DATE_COLUMN in df.columns:
+        dates = pd.to_datetime(df.pop(ISO_DATE_COLUMN), format=ISO_DATE_FORMAT)
+        df.insert(0, TIME_COLUMN, dates)
+    else:
+        raise ValueError(f"{path}: no '{TIME_COLUMN}' or '{ISO_DATE_COLUMN}' column")
+    
+    return df
+
+
+def _cache_path(path, cache_dir):
+    path = Path(path)
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+    return Path(cache_dir) / f'{path.stem}-{digest}.npy'
+
+
+def _write_cache(df, cache_path):
+    """Store a parsed table as a structured .npy (column names become fields)"""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    records = np.empty(len(df), dtype=[(str(col), df[col].to_numpy().dtype)
+                                       for col in df.columns])
+    for col in df.columns:
+        records[str(col)] = df[col].to_numpy()
+    
+    # Drop caches of earlier versions of the same CSV
+    stem = cache_path.stem.rsplit('-', 1)[0]
+    for old in cache_path.parent.glob(f'{stem}-*.npy'):
+        old.unlink()
+    np.save(cache_path, records)
+
+
+def read_timeseries(path, use_cache=True, cache_dir=CACHE_DIR):
+    """
+    Load a time series CSV, using the binary cache when it is current
+    Cached tables are memory-mapped, so warm loads do no text parsing.
+    Returns (DataFrame, loaded_from_cache).
+    """
+    if not use_cache:
+        return parse_timeseries_csv(path), False
+    
+    cache_path = _cache_path(path, cache_dir)
+    if cache_path.exists():
+        records = np.load(cache_path, mmap_mode='r')
+        df = pd.DataFrame({name: records[name] for name in records.dtype.names})
+        return df, True
+    
+    df = parse_timeseries_csv(path)
+    # Object columns (e.g. strings) cannot go in a structured .npy
+    if not any(df[col].to_numpy().dtype.hasobject for col in df.columns):
+        _write_cache(df, cache_path)
+    return df, False
 
-def load_data():
-    """Load all CSV data files"""
+
+def load_data(use_cache=True, stats=None):
+    """
+    Load all CSV data files
+    stats: optional dict that receives 'cached' and 'parsed' file counts
+    """
     data = {}
+    if stats is None:
+        stats = {}
+    stats.update(cached=0, parsed=0)
     
-    # Load fraction dynamics
-    data['narok_dynamics'] = pd.read_csv(
-        DATA_DIR / 'Narok_Crops Soil Veg and Shadow Dynamics.csv',
-        parse_dates=['system:time_start']
-    )
-    data['kajiado_dynamics'] = pd.read_csv(
-        DATA_DIR / 'Kajiado_Shrub Soil Veg and Shadow Dynamics.csv',
-        parse_dates=['system:time_start']
-    )
-    data['turkana_dynamics'] = pd.read_csv(
-        DATA_DIR / 'Turkana_Bare Soil Veg and Shadow Dynamics.csv',
-        parse_dates=['system:time_start']
-    )
-    
-    # Load RMSE accuracy
-    data['narok_rmse'] = pd.read_csv(
-        DATA_DIR / 'Narok_Crops Model Accuracy_RMSE.csv',
-        parse_dates=['system:time_start']
-    )
-    data['kajiado_rmse'] = pd.read_csv(
-        DATA_DIR / 'Kajiado_Shrub Model Accuracy RMSE.csv',
-        parse_dates=['system:time_start']
-    )
-    data['turkana_rmse'] = pd.read_csv(
-        DATA_DIR / 'Turkana_Bare Model Accuracy RMSE.csv',
-        parse_dates=['system:time_start']
-    )
+    # Load fraction dynamics and RMSE accuracy
+    for key, filename in DATA_FILES.items():
+        data[key], from_cache = read_timeseries(DATA_DIR / filename, use_cache)
+        stats['cached' if from_cache else 'parsed'] += 1
     
     return data
 
 
+def load_data_from_store(store_dir, start=None, end=None):
+    """
+    Load the same datasets from the consolidated store instead of the CSVs
+    Only the partitions for the charted sites and [start, end] are read.
+    '<site>_dynamics' already carries the aligned RMSE column.
+    """
+    data = {}
+    for site_key, site in SITE_NAMES.items():
+        table = FractionStore.read_site(store_dir, site, start, end)
+        data[f'{site_key}_dynamics'] = table
+        data[f'{site_key}_rmse'] = table.loc[table['RMSE'].notna(),
+                                             [TIME_COLUMN, 'RMSE']].reset_index(drop=True)
+    return data
+
+
+def load_uncertainty(directory, use_cache=True):
+    """
+    Endmember-uncertainty bands (EndmemberUncertainty.py) for the charted
+    sites that have a '<Site> Endmember Uncertainty.csv' in directory
+    """
+    data = {}
+    for site_key, site in SITE_NAMES.items():
+        path = Path(directory) / EndmemberUncertainty.UNCERTAINTY_FILE.format(site=site)
+        if path.exists():
+            data[f'{site_key}_uncertainty'], _ = read_timeseries(path, use_cache)
+    return data
+
+
+def site_table(data, site_key):
+    """Fractions and RMSE of a site aligned on system:time_start"""
+    dynamics = data[f'{site_key}_dynamics']
+    if 'RMSE' in dynamics.columns:
+        return dynamics
+    with Instrumentation.span(f'merge {site_key}', category='merge'):
+        return pd.merge(dynamics, data[f'{site_key}_rmse'], on=TIME_COLUMN, how='left')
+
+
+def minmax_decimate_indices(x, columns, n_buckets):
+    """
+    Row indices that keep the min and max of every column in each x bucket
+    Buckets are equal-width in x (one per output pixel column), so the
+    drawn envelope is unchanged at the target resolution while the number
+    of points depends only on n_buckets. First and last rows are kept.
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    
+    span = x[-1] - x[0]
+    buckets = np.zeros(n, dtype=np.int64) if span <= 0 else \
+        np.minimum(((x - x[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+    
+    keep = [np.array([0, n - 1])]
+    for values in columns:
+        values = np.asarray(values, dtype=float)
+        for fill in (np.inf, -np.inf):
+            # Sort by bucket then value; the first row per bucket is its min (or max)
+            order = np.lexsort((np.where(np.isnan(values), fill, values) * np.sign(fill),
+                                buckets))
+            first = np.flatnonzero(np.diff(np.concatenate([[-1], buckets[order]])))
+            keep.append(order[first])
+    
+    return np.unique(np.concatenate(keep))
+
+
+def decimate_data(data, n_buckets=DECIMATE_BUCKETS):
+    """
+    Decimation stage applied before plotting large time series
+    Each site's fractions and RMSE are aligned, then reduced jointly with
+    min/max-per-bucket so Soil, Veg, Shadow, the stacked Soil+Veg boundary
+    and RMSE keep their envelopes. RMSE statistics are computed from the
+    full series first. Returns a new data dict.
+    """
+    rmse_statistics(data)
+    decimated = dict(data)
+    
+    for site_key in SITE_NAMES:
+        table = site_table(data, site_key).sort_values(TIME_COLUMN).reset_index(drop=True)
+        columns = [table['Soil'], table['Veg'], table['Shadow'],
+                   table['Soil'] + table['Veg'], table['RMSE']]
+        idx = minmax_decimate_indices(mdates.date2num(table[TIME_COLUMN].to_numpy()),
+                                      columns, n_buckets)
+        table = table.iloc[idx].reset_index(drop=True)
+        
+        decimated[f'{site_key}_dynamics'] = table
+        decimated[f'{site_key}_rmse'] = table.loc[table['RMSE'].notna(),
+                                                  [TIME_COLUMN, 'RMSE']].reset_index(drop=True)
+    
+    return decimated
+
+
+def composite_data(data, freq='10D', method='linear'):
+    """
+    Regularise every site onto an evenly spaced date grid (Compositing.py)
+    so charts and statistics see one value per 5-day, 10-day or monthly step
+    Returns a new data dict.
+    """
+    composited = dict(data)
+    composited.pop('rmse_stats', None)
+    
+    for site_key in SITE_NAMES:
+        table = Compositing.composite_table(site_table(data, site_key), freq, method)
+        composited[f'{site_key}_dynamics'] = table
+        composited[f'{site_key}_rmse'] = table.loc[table['RMSE'].notna(),
+                                                   [TIME_COLUMN, 'RMSE']].reset_index(drop=True)
+    
+    return composited
+
+
+def rmse_statistics(data):
+    """
+    Per-site RMSE statistics layer (SiteStatistics.StatisticsIndex)
+    Uses data['rmse_stats'] when main() attached a persisted index,
+    otherwise builds one from the loaded RMSE series once and keeps it.
+    """
+    if 'rmse_stats' not in data:
+        index = StatisticsIndex()
+        for site_key, site in SITE_NAMES.items():
+            index.update_from_table(site, data[f'{site_key}_rmse'])
+        data['rmse_stats'] = index
+    return data['rmse_stats']
+
+
+def _draw_uncertainty(ax, data, site_key, column, color, label=None):
+    """Shade a column's endmember-uncertainty band, if one was loaded"""
+    bands = data.get(f'{site_key}_uncertainty')
+    if bands is None:
+        return
+    ax.fill_between(bands[TIME_COLUMN], bands[f'{column}_lo'], bands[f'{column}_hi'],
+                    color=color, alpha=0.35, linewidth=0, label=label)
+
+
 def create_figure3_narok_temporal(data):
     """
     FIGURE 3: Narok Temporal Dynamics with RMSE
@@ -84,15 +324,8 @@ def create_figure3_narok_temporal(data):
     (C) Shadow fraction (blue)
     (D) RMSE (black)
     """
-    narok_dyn = data['narok_dynamics']
-    narok_rmse = data['narok_rmse']
-    
-    # Merge RMSE with dynamics data
-    merged = pd.merge(
-        narok_dyn, narok_rmse,
-        on='system:time_start',
-        how='left'
-    )
+    # RMSE aligned with dynamics data
+    merged = site_table(data, 'narok')
     
     # Create figure with 4 subplots (stacked vertically)
     fig, axes = plt.subplots(4, 1, figsize=(12, 10), sharex=True)
@@ -110,6 +343,7 @@ def create_figure3_narok_temporal(data):
             color='#D2691E', linewidth=2, marker='o', markersize=4, label='Soil')
     ax.fill_between(merged['system:time_start'], merged['Soil'], 
                      alpha=0.3, color='#D2691E')
+    _draw_uncertainty(ax, data, 'narok', 'Soil', '#D2691E', UNCERTAINTY_LABEL)
     ax.set_ylabel('Soil Fraction', fontweight='bold')
     ax.set_ylim(0, 1.0)
     ax.grid(True, alpha=0.3, linestyle='--')
@@ -126,6 +360,7 @@ def create_figure3_narok_temporal(data):
             color='#228B22', linewidth=2, marker='s', markersize=4, label='Vegetation')
     ax.fill_between(merged['system:time_start'], merged['Veg'], 
                      alpha=0.3, color='#228B22')
+    _draw_uncertainty(ax, data, 'narok', 'Veg', '#228B22', UNCERTAINTY_LABEL)
     ax.set_ylabel('Vegetation Fraction', fontweight='bold')
     ax.set_ylim(0, 1.0)
     ax.grid(True, alpha=0.3, linestyle='--')
@@ -142,6 +377,7 @@ def create_figure3_narok_temporal(data):
             color='#4169E1', linewidth=2, marker='^', markersize=4, label='Shadow')
     ax.fill_between(merged['system:time_start'], merged['Shadow'], 
                      alpha=0.3, color='#4169E1')
+    _draw_uncertainty(ax, data, 'narok', 'Shadow', '#4169E1', UNCERTAINTY_LABEL)
     ax.set_ylabel('Shadow Fraction', fontweight='bold')
     ax.set_ylim(0, 1.0)
     ax.grid(True, alpha=0.3, linestyle='--')
@@ -160,6 +396,7 @@ def create_figure3_narok_temporal(data):
                alpha=0.7, label='Good Fit Threshold (0.10)')
     ax.fill_between(merged['system:time_start'], merged['RMSE'], 
                      alpha=0.2, color='gray')
+    _draw_uncertainty(ax, data, 'narok', 'RMSE', 'black', UNCERTAINTY_LABEL)
     ax.set_ylabel('RMSE', fontweight='bold')
     ax.set_xlabel('Date (2023)', fontweight='bold', fontsize=11)
     ax.set_ylim(0, 0.20)
@@ -187,15 +424,10 @@ def create_figure3_narok_temporal(data):
     
     plt.tight_layout()
     
-    # Save figure
+    # Save figure and the high-res version for publication from one 600 dpi render
     output_path = OUTPUT_DIR / 'Figure3_Narok_Temporal_Dynamics.png'
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    print(f"✓ Saved: {output_path}")
-    
-    # Also save as high-res version for publication
     output_path_hires = OUTPUT_DIR / 'Figure3_Narok_Temporal_Dynamics_HighRes.tiff'
-    plt.savefig(output_path_hires, dpi=600, bbox_inches='tight')
-    print(f"✓ Saved: {output_path_hires}")
+    FigureExport.export_figure(plt.gcf(), [(output_path, 300), (output_path_hires, 600)])
     
     plt.close()
 
@@ -234,6 +466,7 @@ def create_figure4_multisite_comparison(data):
                     label='Soil', alpha=0.9)
         ax_left.fill_between(dyn_data['system:time_start'], dyn_data['Soil'],
                             alpha=0.2, color=soil_color)
+        _draw_uncertainty(ax_left, data, site_key, 'Soil', soil_color)
         
         # Plot Vegetation
         ax_left.plot(dyn_data['system:time_start'], dyn_data['Veg'],
@@ -241,6 +474,7 @@ def create_figure4_multisite_comparison(data):
                     label='Vegetation', alpha=0.9)
         ax_left.fill_between(dyn_data['system:time_start'], dyn_data['Veg'],
                             alpha=0.2, color=veg_color)
+        _draw_uncertainty(ax_left, data, site_key, 'Veg', veg_color)
         
         ax_left.set_ylabel('Fractional Cover', fontweight='bold', fontsize=11)
         ax_left.set_ylim(0, 1.0)
@@ -266,15 +500,17 @@ def create_figure4_multisite_comparison(data):
                      label='RMSE', alpha=0.9)
         ax_right.fill_between(rmse_data['system:time_start'], rmse_data['RMSE'],
                              alpha=0.15, color='gray')
+        _draw_uncertainty(ax_right, data, site_key, 'RMSE', 'black')
         
         # Add threshold line
         ax_right.axhline(y=0.10, color='red', linestyle=':', linewidth=2.5,
                         alpha=0.7, label='Good Fit (≤0.10)')
         
-        # Calculate and display statistics
-        mean_rmse = rmse_data['RMSE'].mean()
-        median_rmse = rmse_data['RMSE'].median()
-        pct_good = (rmse_data['RMSE'] <= 0.10).sum() / len(rmse_data) * 100
+        # Display statistics
+        site_stats = rmse_statistics(data)[SITE_NAMES[site_key]]
+        mean_rmse = site_stats.mean
+        median_rmse = site_stats.median
+        pct_good = site_stats.pct_good
         
         stats_text = f'Mean: {mean_rmse:.3f}\nMedian: {median_rmse:.3f}\n{pct_good:.1f}% ≤0.10'
         ax_right.text(0.98, 0.97, stats_text, transform=ax_right.transAxes,
@@ -309,50 +545,128 @@ def create_figure4_multisite_comparison(data):
     
     plt.tight_layout()
     
-    # Save figure
+    # Save figure and the high-res version for publication from one 600 dpi render
     output_path = OUTPUT_DIR / 'Figure4_MultiSite_Comparison.png'
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    print(f"✓ Saved: {output_path}")
-    
-    # High-res version
     output_path_hires = OUTPUT_DIR / 'Figure4_MultiSite_Comparison_HighRes.tiff'
-    plt.savefig(output_path_hires, dpi=600, bbox_inches='tight')
-    print(f"✓ Saved: {output_path_hires}")
+    FigureExport.export_figure(plt.gcf(), [(output_path, 300), (output_path_hires, 600)])
     
     plt.close()
 
 
-def create_individual_site_charts(data):
-    """Create individual detailed charts for each site"""
+def create_fraction_map(raster_root, site, date, output_path=None, dpi=300):
+    """
+    Map figure of one scene's Soil / Veg / Shadow / RMSE rasters
+    Four panels (2 x 2); each panel reads only the overview level whose
+    resolution matches the panel size at the output DPI.
+    """
+    path = FractionRasters.scene_path(raster_root, site, date)
+    date = pd.Timestamp(date)
+    meta = FractionRasters.load_meta(path)
     
-    sites = [
-        ('narok', 'Narok Agricultural Cropland'),
-        ('kajiado', 'Kajiado Acacia Shrubland'),
-        ('turkana', 'Turkana Arid Rangeland')
-    ]
+    fig, axes = plt.subplots(2, 2, figsize=(12, 10))
+    fig.suptitle(f'{site}: Fractional Cover Maps {date:%d %b %Y}',
+                 fontsize=14, fontweight='bold', y=0.995)
     
-    for site_key, site_name in sites:
-        dyn_data = data[f'{site_key}_dynamics']
-        rmse_data = data[f'{site_key}_rmse']
+    # Panel width in output pixels decides the overview level
+    level = FractionRasters.choose_level(meta, int(fig.get_figwidth() / 2 * dpi))
+    
+    panels = [
+        ('Soil', 'Soil Fraction', 'Reds', 1.0),
+        ('Veg', 'Vegetation Fraction', 'Greens', 1.0),
+        ('Shadow', 'Shadow Fraction', 'Blues', 1.0),
+        ('RMSE', 'RMSE', 'Greys', 0.20),
+    ]
+    for ax, label, (name, title, cmap, vmax) in zip(axes.flat, ['(A)', '(B)', '(C)', '(D)'], panels):
+        raster = FractionRasters.read_window(path, name, level)
+        image = ax.imshow(raster, cmap=cmap, vmin=0, vmax=vmax, interpolation='nearest')
+        ax.set_title(title, fontweight='bold', fontsize=11)
+        ax.set_xticks([])
+        ax.set_yticks([])
+        fig.colorbar(image, ax=ax, fraction=0.046, pad=0.04)
         
-        # Create combined chart with all fractions + RMSE
-        fig, axes = plt.subplots(2, 1, figsize=(14, 8), sharex=True,
-                                gridspec_kw={'height_ratios': [2, 1]})
-        fig.suptitle(f'{site_name}: Complete Temporal Analysis 2023',
-                    fontsize=14, fontweight='bold')
-        
-        # Top: All three fractions stacked area chart
-        ax1 = axes[0]
-        ax1.fill_between(dyn_data['system:time_start'], 0, dyn_data['Soil'],
-                        label='Soil', color='#D2691E', alpha=0.7)
-        ax1.fill_between(dyn_data['system:time_start'], dyn_data['Soil'],
-                        dyn_data['Soil'] + dyn_data['Veg'],
-                        label='Vegetation', color='#228B22', alpha=0.7)
-        ax1.fill_between(dyn_data['system:time_start'], 
-                        dyn_data['Soil'] + dyn_data['Veg'],
-                        1.0,
-                        label='Shadow', color='#4169E1', alpha=0.7)
+        ax.text(0.02, 0.98, label, transform=ax.transAxes,
+                fontsize=12, fontweight='bold', va='top',
+                bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+    
+    plt.tight_layout()
+    
+    # Save
+    if output_path is None:
+        output_path = OUTPUT_DIR / f'{site}_Fraction_Maps_{date:%Y%m%d}.png'
+    rows, cols = meta['levels'][level]
+    print(f"✓ Read overview level {level} ({rows} x {cols}) of {site} {date:%Y-%m-%d}")
+    FigureExport.export_figure(plt.gcf(), [(output_path, dpi)])
+    
+    plt.close()
+
+
+def render_fraction_map(data, raster_root, site, date):
+    """Render task for create_fraction_map (maps read rasters, not the series data)"""
+    create_fraction_map(raster_root, site, date)
+
+
+def map_scenes(raster_root, dates=None):
+    """
+    Scenes to map as (site, date): the given dates where stored, otherwise
+    the latest stored scene of each charted site
+    """
+    dates = {pd.Timestamp(date) for date in dates or []}
+    scenes = []
+    for site in SITE_NAMES.values():
+        stored = FractionRasters.list_scenes(raster_root, site)
+        if dates:
+            scenes += [(site, date) for date in stored if date in dates]
+        elif stored:
+            scenes.append((site, stored[-1]))
+    return scenes
+
+
+def _fill_between_verts(x, y1, y2):
+    """
+    Polygons equivalent to Axes.fill_between(x, y1, y2), split at NaNs
+    Used to update fill areas in place instead of creating new artists.
+    """
+    x = mdates.date2num(np.asarray(x))
+    y1 = np.broadcast_to(np.asarray(y1, dtype=float), x.shape)
+    y2 = np.broadcast_to(np.asarray(y2, dtype=float), x.shape)
+    valid = ~(np.isnan(x) | np.isnan(y1) | np.isnan(y2))
+    
+    polys = []
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], valid.astype(int), [0]])))
+    for start, stop in zip(edges[::2], edges[1::2]):
+        xs, lo, hi = x[start:stop], y1[start:stop], y2[start:stop]
+        polys.append(np.concatenate([
+            [[xs[0], hi[0]]],
+            np.column_stack([xs, lo]),
+            [[xs[-1], hi[-1]]],
+            np.column_stack([xs[::-1], hi[::-1]]),
+        ]))
+    return polys
+
+
+class SiteChartTemplate:
+    """
+    Reusable figure skeleton for the individual site charts
+    Axes, grid, legends, labels and date formatting are built once; each
+    site only swaps the line data and fill polygons. Layout (tight_layout
+    and the tight bounding box) is recomputed only when axis limits change.
+    """
+    
+    def __init__(self):
+        # Not registered with pyplot, so it never becomes the current figure
+        self.fig = Figure(figsize=(14, 8))
+        FigureCanvasAgg(self.fig)
+        self.ax1, self.ax2 = self.fig.subplots(2, 1, sharex=True,
+                                               gridspec_kw={'height_ratios': [2, 1]})
+        self.title = self.fig.suptitle('', fontsize=14, fontweight='bold')
         
+        # Top: All three fractions stacked area chart (data filled in per site)
+        ax1 = self.ax1
+        self.fills = [
+            ax1.fill_between([], [], [], label='Soil', color='#D2691E', alpha=0.7),
+            ax1.fill_between([], [], [], label='Vegetation', color='#228B22', alpha=0.7),
+            ax1.fill_between([], [], [], label='Shadow', color='#4169E1', alpha=0.7),
+        ]
         ax1.set_ylabel('Fractional Cover (Cumulative)', fontweight='bold')
         ax1.set_ylim(0, 1.0)
         ax1.grid(True, alpha=0.3, linestyle='--')
@@ -360,21 +674,14 @@ def create_individual_site_charts(data):
         ax1.set_title('Endmember Fractions (Stacked)', fontsize=11, pad=5)
         
         # Bottom: RMSE
-        ax2 = axes[1]
-        
-        # Merge to align dates
-        merged = pd.merge(dyn_data, rmse_data, on='system:time_start', how='left')
-        
-        ax2.plot(merged['system:time_start'], merged['RMSE'],
-                color='black', linewidth=2, marker='o', markersize=4, label='RMSE')
+        ax2 = self.ax2
+        self.rmse_line, = ax2.plot([], [], color='black', linewidth=2, marker='o',
+                                   markersize=4, label='RMSE')
         ax2.axhline(y=0.10, color='red', linestyle=':', linewidth=2,
-                   alpha=0.7, label='Acceptable Threshold (0.10)')
-        ax2.fill_between(merged['system:time_start'], merged['RMSE'],
-                        alpha=0.2, color='gray')
-        
+                    alpha=0.7, label='Acceptable Threshold (0.10)')
+        self.rmse_fill = ax2.fill_between([], [], alpha=0.2, color='gray')
         ax2.set_ylabel('RMSE', fontweight='bold')
         ax2.set_xlabel('Date (2023)', fontweight='bold')
-        ax2.set_ylim(0, max(0.25, merged['RMSE'].max() * 1.1))
         ax2.grid(True, alpha=0.3, linestyle='--')
         ax2.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize=10)
         ax2.set_title('Model Reconstruction Accuracy', fontsize=11, pad=5)
@@ -382,17 +689,83 @@ def create_individual_site_charts(data):
         # Format x-axis
         ax2.xaxis.set_major_formatter(mdates.DateFormatter('%b %d'))
         ax2.xaxis.set_major_locator(mdates.MonthLocator())
-        plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45, ha='right')
         
-        plt.tight_layout()
+        self._layout_limits = None
+        self._bbox = None
+        self.layout_count = 0
+    
+    def update(self, site_name, dyn_data, merged):
+        """Swap in one site's data"""
+        self.title.set_text(f'{site_name}: Complete Temporal Analysis 2023')
+        
+        dates = dyn_data['system:time_start']
+        soil = dyn_data['Soil'].to_numpy()
+        soil_veg = soil + dyn_data['Veg'].to_numpy()
+        for fill, (lower, upper) in zip(self.fills, [(0, soil), (soil, soil_veg),
+                                                     (soil_veg, 1.0)]):
+            fill.set_verts(_fill_between_verts(dates, lower, upper))
+        
+        self.rmse_line.set_data(merged['system:time_start'], merged['RMSE'])
+        self.rmse_fill.set_verts(_fill_between_verts(merged['system:time_start'],
+                                                     0, merged['RMSE']))
+        
+        # Same limits autoscaling would give (default 5% x margin)
+        x = mdates.date2num(np.concatenate([dates.to_numpy(),
+                                            merged['system:time_start'].to_numpy()]))
+        if np.isnan(x).all():
+            # No observations: matplotlib's default date range for empty axes
+            x0, x1 = mdates.date2num(np.datetime64('2000-01-01')), \
+                mdates.date2num(np.datetime64('2010-01-01'))
+            margin = 0
+        else:
+            x0, x1 = np.nanmin(x), np.nanmax(x)
+            margin = (x1 - x0) * plt.rcParams['axes.xmargin']
+        self.ax2.set_xlim(x0 - margin, x1 + margin)
+        self.ax2.set_ylim(0, max(0.25, merged['RMSE'].max() * 1.1))
+    
+    def _layout(self):
+        """Re-run layout only if the axes limits changed since last time"""
+        limits = (self.ax2.get_xlim(), self.ax2.get_ylim())
+        if limits == self._layout_limits:
+            return
+        plt.setp(self.ax2.xaxis.get_majorticklabels(), rotation=45, ha='right')
+        self.fig.tight_layout()
+        renderer = self.fig.canvas.get_renderer()
+        self._bbox = self.fig.get_tightbbox(renderer).padded(plt.rcParams['savefig.pad_inches'])
+        self._layout_limits = limits
+        self.layout_count += 1
+    
+    def save(self, output_path, dpi=300):
+        self._layout()
+        self.fig.savefig(output_path, dpi=dpi, bbox_inches=self._bbox)
+
+
+_site_chart_template = None
+
+
+def create_individual_site_charts(data, sites=None):
+    """
+    Create individual detailed charts for each site
+    sites: optional subset of INDIVIDUAL_SITES (all sites by default)
+    The figure skeleton is shared across sites (and calls) in this process.
+    """
+    global _site_chart_template
+    
+    if sites is None:
+        sites = INDIVIDUAL_SITES
+    if _site_chart_template is None:
+        _site_chart_template = SiteChartTemplate()
+    template = _site_chart_template
+    
+    for site_key, site_name in sites:
+        # Swap this site's fractions + RMSE into the combined chart
+        template.update(site_name, data[f'{site_key}_dynamics'], site_table(data, site_key))
         
         # Save
         safe_name = site_key.capitalize()
         output_path = OUTPUT_DIR / f'{safe_name}_Complete_Analysis.png'
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
+        template.save(output_path, dpi=300)
         print(f"✓ Saved: {output_path}")
-        
-        plt.close()
 
 
 def create_rmse_comparison_chart(data):
@@ -400,20 +773,19 @@ def create_rmse_comparison_chart(data):
     
     fig, ax = plt.subplots(figsize=(10, 6))
     
-    # Prepare data for box plot
-    rmse_data = [
-        data['narok_rmse']['RMSE'],
-        data['kajiado_rmse']['RMSE'],
-        data['turkana_rmse']['RMSE']
-    ]
-    
-    labels = ['Narok\nCropland\n(n=65)', 'Kajiado\nShrubland\n(n=21)', 'Turkana\nRangeland\n(n=42)']
+    # Box plot statistics from the statistics layer
+    index = rmse_statistics(data)
+    site_labels = [('narok', 'Narok\nCropland'), ('kajiado', 'Kajiado\nShrubland'),
+                   ('turkana', 'Turkana\nRangeland')]
+    site_stats = [index[SITE_NAMES[site_key]] for site_key, _ in site_labels]
+    box_stats = [stats.boxplot_stats(f'{label}\n(n={stats.count})')
+                 for stats, (_, label) in zip(site_stats, site_labels)]
     
     # Create box plot
-    bp = ax.boxplot(rmse_data, tick_labels=labels, patch_artist=True,
-                    widths=0.6, showmeans=True,
-                    meanprops=dict(marker='D', markerfacecolor='red', markersize=8),
-                    medianprops=dict(color='black', linewidth=2))
+    bp = ax.bxp(box_stats, patch_artist=True,
+                widths=0.6, showmeans=True,
+                meanprops=dict(marker='D', markerfacecolor='red', markersize=8),
+                medianprops=dict(color='black', linewidth=2))
     
     # Color boxes
     colors = ['#90EE90', '#FFD700', '#FF6347']
@@ -426,10 +798,10 @@ def create_rmse_comparison_chart(data):
               alpha=0.7, label='Operational Threshold (0.10)')
     
     # Add statistics as text
-    for i, (rmse_vals, x_pos) in enumerate(zip(rmse_data, [1, 2, 3])):
-        mean_val = rmse_vals.mean()
-        median_val = rmse_vals.median()
-        pct_good = (rmse_vals <= 0.10).sum() / len(rmse_vals) * 100
+    for i, (stats, x_pos) in enumerate(zip(site_stats, [1, 2, 3])):
+        mean_val = stats.mean
+        median_val = stats.median
+        pct_good = stats.pct_good
         
         stats_text = f'μ={mean_val:.3f}\nMd={median_val:.3f}\n{pct_good:.0f}%≤0.10'
         ax.text(x_pos, ax.get_ylim()[1] * 0.95, stats_text,
@@ -462,38 +834,27 @@ def create_summary_table(data):
     ax.axis('tight')
     ax.axis('off')
     
-    # Calculate statistics
+    # Read statistics from the statistics layer
+    index = rmse_statistics(data)
+    rows = [(site.capitalize(), index[SITE_NAMES[site]])
+            for site in ['narok', 'kajiado', 'turkana']]
+    
+    # Add overall
+    rows.append(('Overall', index.overall([SITE_NAMES[site] for site in SITE_NAMES])))
+    
     stats = []
-    for site in ['narok', 'kajiado', 'turkana']:
-        rmse_vals = data[f'{site}_rmse']['RMSE']
-        dyn_vals = data[f'{site}_dynamics']
-        
+    for name, site_stats in rows:
         stats.append([
-            site.capitalize(),
-            len(rmse_vals),
-            f"{rmse_vals.mean():.3f}",
-            f"{rmse_vals.median():.3f}",
-            f"{rmse_vals.std():.3f}",
-            f"{rmse_vals.min():.3f}",
-            f"{rmse_vals.max():.3f}",
-            f"{(rmse_vals <= 0.10).sum() / len(rmse_vals) * 100:.1f}%"
+            name,
+            site_stats.count,
+            f"{site_stats.mean:.3f}",
+            f"{site_stats.median:.3f}",
+            f"{site_stats.std:.3f}",
+            f"{site_stats.min:.3f}",
+            f"{site_stats.max:.3f}",
+            f"{site_stats.pct_good:.1f}%"
         ])
     
-    # Add overall
-    all_rmse = pd.concat([data['narok_rmse']['RMSE'], 
-                          data['kajiado_rmse']['RMSE'],
-                          data['turkana_rmse']['RMSE']])
-    stats.append([
-        'Overall',
-        len(all_rmse),
-        f"{all_rmse.mean():.3f}",
-        f"{all_rmse.median():.3f}",
-        f"{all_rmse.std():.3f}",
-        f"{all_rmse.min():.3f}",
-        f"{all_rmse.max():.3f}",
-        f"{(all_rmse <= 0.10).sum() / len(all_rmse) * 100:.1f}%"
-    ])
-    
     columns = ['Site', 'Observations', 'Mean RMSE', 'Median RMSE', 
                'Std Dev', 'Min', 'Max', '% Good Fit\n(≤0.10)']
     
@@ -531,37 +892,414 @@ def create_summary_table(data):
     plt.close()
 
 
-def main():
+# One output figure: which datasets it reads and which files it writes
+RenderTask = namedtuple('RenderTask', ['label', 'func', 'kwargs', 'inputs', 'outputs'])
+
+ALL_SITE_KEYS = ['narok', 'kajiado', 'turkana']
+
+
+def _site_inputs(site_keys):
+    return [f'{site}_{kind}' for site in site_keys for kind in ('dynamics', 'rmse')]
+
+
+def figure_tasks(scenes=None, raster_root=None):
+    """
+    List of render tasks, one per output figure
+    scenes: (site, date) pairs to draw fraction maps for from raster_root
+    """
+    tasks = [
+        RenderTask('Figure 3', create_figure3_narok_temporal, {},
+                   _site_inputs(['narok']) + ['narok_uncertainty'],
+                   ['Figure3_Narok_Temporal_Dynamics.png',
+                    'Figure3_Narok_Temporal_Dynamics_HighRes.tiff']),
+        RenderTask('Figure 4', create_figure4_multisite_comparison, {},
+                   _site_inputs(ALL_SITE_KEYS)
+                   + [f'{site}_uncertainty' for site in ALL_SITE_KEYS],
+                   ['Figure4_MultiSite_Comparison.png',
+                    'Figure4_MultiSite_Comparison_HighRes.tiff']),
+    ]
+    for site in INDIVIDUAL_SITES:
+        site_key = site[0]
+        tasks.append(RenderTask(f'{site_key.capitalize()} site chart',
+                                create_individual_site_charts, {'sites': [site]},
+                                _site_inputs([site_key]),
+                                [f'{site_key.capitalize()}_Complete_Analysis.png']))
+    tasks += [
+        RenderTask('RMSE box plot', create_rmse_comparison_chart, {},
+                   [f'{site}_rmse' for site in ALL_SITE_KEYS],
+                   ['RMSE_MultiSite_BoxPlot.png']),
+        RenderTask('Table 1', create_summary_table, {},
+                   _site_inputs(ALL_SITE_KEYS),
+                   ['Table1_RMSE_Summary.png']),
+    ]
+    for site, date in scenes or []:
+        date = pd.Timestamp(date)
+        tasks.append(RenderTask(f'{site} map {date:%Y-%m-%d}', render_fraction_map,
+                                {'raster_root': str(raster_root), 'site': site, 'date': date},
+                                [f'raster:{site}:{date:%Y%m%d}'],
+                                [f'{site}_Fraction_Maps_{date:%Y%m%d}.png']))
+    return tasks
+
+
+_digest_cache = {}
+
+
+def _file_digest(path):
+    """SHA-256 of a file's bytes; only re-hashed when its size or mtime changed"""
+    path = Path(path)
+    stat = path.stat()
+    key = str(path.resolve())
+    entry = _digest_cache.get(key)
+    if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return entry[2]
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    _digest_cache[key] = [stat.st_size, stat.st_mtime_ns, digest]
+    return digest
+
+
+def load_digest_cache(output_dir=OUTPUT_DIR):
+    """Read the input digest cache (empty if missing or unreadable)"""
+    _digest_cache.clear()
+    try:
+        _digest_cache.update(json.loads((Path(output_dir) / DIGEST_CACHE_NAME).read_text()))
+    except (OSError, ValueError):
+        pass
+
+
+def save_digest_cache(output_dir=OUTPUT_DIR):
+    """Write the input digest cache, dropping files that no longer exist"""
+    for key in [key for key in _digest_cache if not Path(key).exists()]:
+        del _digest_cache[key]
+    path = Path(output_dir) / DIGEST_CACHE_NAME
+    path.write_text(json.dumps(_digest_cache, sort_keys=True))
+
+
+def _dataset_digest(key, store_dir=None, uncertainty_dir=None, raster_root=None):
+    """Digest of the files a dataset is loaded from (CSV, store partitions or rasters)"""
+    if key.startswith('raster:'):
+        _, site, date = key.split(':')
+        path = FractionRasters.scene_path(raster_root, site, date)
+        h = hashlib.sha256()
+        for file in sorted(p for p in path.rglob('*') if p.is_file()):
+            h.update(f'{file.relative_to(path).as_posix()}={_file_digest(file)};'.encode())
+        return h.hexdigest()
+    if key.endswith('_uncertainty'):
+        site = SITE_NAMES[key.rsplit('_', 1)[0]]
+        if uncertainty_dir is None:
+            return 'none'
+        path = Path(uncertainty_dir) / EndmemberUncertainty.UNCERTAINTY_FILE.format(site=site)
+        return _file_digest(path) if path.exists() else 'none'
+    if store_dir is None:
+        return _file_digest(DATA_DIR / DATA_FILES[key])
+    
+    h = hashlib.sha256()
+    site = SITE_NAMES[key.rsplit('_', 1)[0]]
+    for _, year, path in FractionStore.list_partitions(store_dir, [site]):
+        for column_file in sorted(path.glob('*.npy')):
+            h.update(f'{year}/{column_file.name}={_file_digest(column_file)};'.encode())
+    return h.hexdigest()
+
+
+def _rcparams_digest():
+    items = sorted((key, repr(value)) for key, value in plt.rcParams.items())
+    return hashlib.sha256(repr(items).encode()).hexdigest()
+
+
+def render_options(args):
+    """Data-transform options that change what a figure shows"""
+    return {
+        'composite': args.composite,
+        'composite_method': args.composite_method if args.composite else None,
+        'decimate': args.decimate or 'off',
+        # Charts read RMSE statistics from the persisted index instead of the series
+        'stats_index': str(args.stats_index) if args.stats_index is not None else None,
+    }
+
+
+def task_fingerprint(task, file_digests=None, store_dir=None, uncertainty_dir=None,
+                     options=None, raster_root=None):
+    """
+    Fingerprint of everything a figure depends on:
+    input file bytes, rcParams, the source of the plotting code and the
+    data-transform options (render_options)
+    """
+    if file_digests is None:
+        file_digests = {}
+    h = hashlib.sha256()
+    for key in sorted(task.inputs):
+        if key not in file_digests:
+            file_digests[key] = _dataset_digest(key, store_dir, uncertainty_dir, raster_root)
+        h.update(f'{key}={file_digests[key]};'.encode())
+    h.update(_rcparams_digest().encode())
+    # Plotting code lives in this module together with its helpers (templates)
+    h.update(inspect.getsource(inspect.getmodule(task.func)).encode())
+    h.update(inspect.getsource(FigureExport).encode())
+    h.update(FigureExport.settings()['tiff_compression'].encode())
+    h.update(repr(task.kwargs).encode())
+    h.update(repr(sorted((options or {}).items())).encode())
+    return h.hexdigest()
+
+
+def load_manifest(output_dir=OUTPUT_DIR):
+    """Read the figure fingerprint manifest (empty if missing or unreadable)"""
+    try:
+        return json.loads((Path(output_dir) / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, output_dir=OUTPUT_DIR):
+    """Write the figure fingerprint manifest"""
+    path = Path(output_dir) / MANIFEST_NAME
+    path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def stale_tasks(tasks, manifest, output_dir=OUTPUT_DIR, store_dir=None, uncertainty_dir=None,
+                options=None, raster_root=None):
+    """
+    Split tasks into (stale, fingerprints)
+    A task is up to date when its fingerprint matches the manifest and all
+    of its output files still exist.
+    """
+    file_digests = {}
+    fingerprints = {}
+    stale = []
+    for task in tasks:
+        fingerprint = task_fingerprint(task, file_digests, store_dir, uncertainty_dir, options,
+                                       raster_root)
+        fingerprints[task.label] = fingerprint
+        outputs_exist = all((Path(output_dir) / name).exists() for name in task.outputs)
+        if manifest.get(task.label) != fingerprint or not outputs_exist:
+            stale.append(task)
+    return stale, fingerprints
+
+
+_worker_data = None
+
+
+def _init_render_worker(data, instrumentation=None, export=None):
+    """Keep one copy of the loaded data per worker process"""
+    global _worker_data
+    _worker_data = data
+    if export is not None:
+        FigureExport.configure(**export)
+    if instrumentation is not None:
+        Instrumentation.configure(**instrumentation)
+        # Forked workers inherit the parent's events; only report their own
+        Instrumentation.collect_events()
+
+
+def _render_task(task, data=None):
+    """
+    Render one figure inside a trace span (and profiler, if configured)
+    Returns (label, wall time in seconds, trace events recorded)
+    """
+    label, func, kwargs = task[:3]
+    start = time.perf_counter()
+    with Instrumentation.profiled(label):
+        with Instrumentation.span(label, category='figure', function=func.__name__):
+            func(_worker_data if data is None else data, **kwargs)
+            if data is None:
+                # Worker processes finish their background writes per task
+                FigureExport.wait()
+    return label, time.perf_counter() - start, Instrumentation.collect_events()
+
+
+def render_figures(data, jobs=1, tasks=None):
+    """
+    Render figures (all by default), optionally in parallel worker processes
+    Workers import this module, so they render with the same rcParams.
+    Returns a list of (label, seconds) in task order.
+    """
+    if tasks is None:
+        tasks = figure_tasks()
+    if not tasks:
+        return []
+    
+    if jobs <= 1:
+        results = []
+        for task in tasks:
+            results.append(_render_task(task, data))
+            print()
+        FigureExport.wait()
+    else:
+        initargs = (data, Instrumentation.settings(), FigureExport.settings())
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_render_worker,
+                                 initargs=initargs) as executor:
+            results = list(executor.map(_render_task, tasks))
+    
+    timings = []
+    for label, seconds, events in results:
+        Instrumentation.add_events(events)
+        timings.append((label, seconds))
+    return timings
+
+
+def print_timing_report(timings, total):
+    """Print per-figure wall times"""
+    width = max([24] + [len(label) for label, _ in timings])
+    print("Render times:")
+    for label, seconds in timings:
+        print(f"  {label:<{width}} {seconds:7.2f} s")
+    print(f"  {'Total (wall clock)':<{width}} {total:7.2f} s")
+    print()
+
+
+def parse_args(argv=None):
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='number of worker processes for figure rendering (default: 1)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always parse the CSVs instead of using the binary cache')
+    parser.add_argument('--store', type=Path, default=None,
+                        help='read data from a consolidated FractionStore directory')
+    parser.add_argument('--stats-index', type=Path, default=None,
+                        help='persisted RMSE statistics index (JSON) to update and chart from')
+    parser.add_argument('--uncertainty', type=Path, default=None, metavar='DIR',
+                        help="shade endmember-uncertainty bands from '<Site> Endmember "
+                             "Uncertainty.csv' files in DIR (EndmemberUncertainty.py)")
+    parser.add_argument('--maps', type=Path, default=None, metavar='RASTER_ROOT',
+                        help='also draw fraction maps from the FractionRasters under '
+                             'RASTER_ROOT (latest scene of each site by default)')
+    parser.add_argument('--map-dates', nargs='+', default=None, metavar='DATE',
+                        help='with --maps, map the scenes of these dates instead')
+    parser.add_argument('--composite', default=None, metavar='FREQ',
+                        help="regularise series onto a '5D', '10D' or 'monthly' grid before "
+                             "statistics and plotting")
+    parser.add_argument('--composite-method', choices=['linear', 'median'], default='linear',
+                        help='gap-filling method for --composite (default: linear)')
+    parser.add_argument('--decimate', type=int, nargs='?', const=DECIMATE_BUCKETS,
+                        default=None, metavar='BUCKETS',
+                        help='min/max-decimate long series to BUCKETS x-buckets before '
+                             f'plotting (default when given: {DECIMATE_BUCKETS})')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip figures whose inputs, rcParams and code are unchanged')
+    parser.add_argument('--no-background-export', action='store_true',
+                        help='wait for each figure\'s PNG/TIFF outputs to be written instead of '
+                             'encoding them while the next figure is plotted')
+    parser.add_argument('--tiff-compression', choices=FigureExport.TIFF_COMPRESSIONS,
+                        default=FigureExport.TIFF_COMPRESSION,
+                        help='lossless compression for high-res TIFFs '
+                             f'(default: {FigureExport.TIFF_COMPRESSION})')
+    parser.add_argument('--trace', type=Path, default=None, metavar='PATH',
+                        help='write a Chrome trace (JSON) of load/merge/figure/savefig spans '
+                             'with RSS samples to PATH')
+    parser.add_argument('--profile', choices=Instrumentation.PROFILE_MODES, default=None,
+                        help='profile each figure with cProfile or tracemalloc')
+    parser.add_argument('--profile-dir', type=Path, default=OUTPUT_DIR / 'profiles',
+                        help='directory for --profile output (default: IMAGES/profiles)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Main execution function"""
+    args = parse_args(argv)
+    Instrumentation.configure(enabled=args.trace is not None, profile=args.profile,
+                              profile_dir=args.profile_dir)
+    FigureExport.configure(background=not args.no_background_export,
+                           tiff_compression=args.tiff_compression)
+    
     print("=" * 60)
     print("Spectral Unmixing Figure Generation Script")
     print("=" * 60)
     print()
     
-    # Load data
-    print("Loading data files...")
-    data = load_data()
-    print(f"✓ Loaded {len(data)} datasets")
-    print()
-    
-    # Generate figures
-    print("Generating figures...")
-    print()
-    
-    create_figure3_narok_temporal(data)
-    print()
+    scenes = map_scenes(args.maps, args.map_dates) if args.maps is not None else None
+    tasks = figure_tasks(scenes, args.maps)
+    # Fingerprints are recorded on every run, so a later --incremental run
+    # knows what the current outputs were rendered from
+    manifest = load_manifest()
+    load_digest_cache()
+    stale, fingerprints = stale_tasks(tasks, manifest, store_dir=args.store,
+                                      uncertainty_dir=args.uncertainty,
+                                      options=render_options(args), raster_root=args.maps)
+    save_digest_cache()
+    if args.incremental:
+        print(f"Incremental build: {len(tasks) - len(stale)} figure(s) up to date, "
+              f"{len(stale)} to render")
+        tasks = stale
+        print()
     
-    create_figure4_multisite_comparison(data)
-    print()
+    timings = []
+    start = time.perf_counter()
+    if tasks:
+        # Load data
+        print("Loading data files...")
+        load_start = time.perf_counter()
+        if args.store is not None:
+            with Instrumentation.span('load_data_from_store'):
+                data = load_data_from_store(args.store)
+            load_time = time.perf_counter() - load_start
+            print(f"✓ Loaded {len(data)} datasets from {args.store} in {load_time * 1000:.1f} ms")
+        else:
+            load_stats = {}
+            with Instrumentation.span('load_data', use_cache=not args.no_cache):
+                data = load_data(use_cache=not args.no_cache, stats=load_stats)
+            load_time = time.perf_counter() - load_start
+            load_kind = 'warm' if load_stats['parsed'] == 0 else 'cold'
+            print(f"✓ Loaded {len(data)} datasets in {load_time * 1000:.1f} ms "
+                  f"({load_kind}: {load_stats['cached']} cached, {load_stats['parsed']} parsed)")
+        print()
+        
+        if args.uncertainty is not None:
+            bands = load_uncertainty(args.uncertainty, use_cache=not args.no_cache)
+            data.update(bands)
+            print(f"✓ Loaded endmember-uncertainty bands for {len(bands)} site(s)")
+            print()
+        
+        # The persisted index only ever sees the raw observations of its
+        # source; composited series would replace the real counts
+        if args.stats_index is not None:
+            source = (source_key('store', args.store) if args.store is not None
+                      else source_key('csv', DATA_DIR))
+            with Instrumentation.span('update_stats_index'):
+                index = StatisticsIndex.load(args.stats_index, source)
+                added = sum(index.update_from_table(site, data[f'{site_key}_rmse'])
+                            for site_key, site in SITE_NAMES.items())
+                index.save(args.stats_index)
+            print(f"✓ Statistics index updated with {added} new observations")
+            print()
+        
+        if args.composite:
+            with Instrumentation.span('composite_data', freq=args.composite):
+                data = composite_data(data, args.composite, args.composite_method)
+            print(f"✓ Composited series to a regular {args.composite} grid "
+                  f"({args.composite_method})")
+            print()
+        
+        if args.stats_index is not None:
+            data['rmse_stats'] = index
+        
+        if args.decimate:
+            with Instrumentation.span('decimate_data', buckets=args.decimate):
+                data = decimate_data(data, args.decimate)
+            print(f"✓ Decimated series to at most {args.decimate} buckets per site")
+            print()
+        
+        # Generate figures
+        print(f"Generating figures ({args.jobs} job{'s' if args.jobs != 1 else ''})...")
+        print()
+        
+        timings = render_figures(data, jobs=args.jobs, tasks=tasks)
+        print()
+    total = time.perf_counter() - start
     
-    create_individual_site_charts(data)
-    print()
+    if tasks:
+        for task in tasks:
+            manifest[task.label] = fingerprints[task.label]
+        save_manifest(manifest)
     
-    create_rmse_comparison_chart(data)
-    print()
+    print_timing_report(timings, total)
     
-    create_summary_table(data)
-    print()
+    if args.trace is not None:
+        Instrumentation.write_trace(args.trace, metadata={
+            'jobs': args.jobs, 'figures': len(timings), 'total_seconds': total})
+        print(f"✓ Trace written: {args.trace}")
+        print()
+    if args.profile is not None:
+        print(f"✓ Profiles ({args.profile}) written to: {args.profile_dir}")
+        print()
     
     print("=" * 60)
     print("✓ All figures generated successfully!")
@@ -0,0 +1,186 @@
+"""
+Timing spans, memory sampling and profiling hooks for GenerateCharts
+Shows whether time goes to CSV parsing, merging, Matplotlib layout or
+PNG/TIFF encoding without attaching a profiler by hand
+
+- span(): timed section recorded as a Chrome trace event ('X' phase) with
+  current and peak RSS; a no-op unless instrumentation is enabled
+- instrument_savefig(): wraps Figure.savefig so every save gets a span
+- profiled(): per-section cProfile (.prof) or tracemalloc (top allocations)
+- write_trace(): JSON trace viewable in chrome://tracing or Perfetto
+"""
+
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_MODES = ['cprofile', 'tracemalloc']
+TRACEMALLOC_TOP = 25
+
+_config = {'enabled': False, 'profile': None, 'profile_dir': None}
+_events = []
+_savefig_patched = False
+
+
+def configure(enabled=False, profile=None, profile_dir=None):
+    """Switch spans and profiling on or off (call again in worker processes)"""
+    if profile is not None and profile not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{profile}'")
+    _config.update(enabled=enabled or profile is not None, profile=profile,
+                   profile_dir=Path(profile_dir) if profile_dir else None)
+    if _config['enabled']:
+        instrument_savefig()
+    return dict(_config)
+
+
+def enabled():
+    return _config['enabled']
+
+
+def settings():
+    """Current configuration, to pass to configure() in worker processes"""
+    return dict(_config)
+
+
+def memory_usage():
+    """(current RSS, peak RSS) in MB; None where the platform cannot say"""
+    current = peak = None
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # ru_maxrss is KB on Linux, bytes on macOS
+        scale = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+        if current is not None:
+            # statm and getrusage are sampled separately; keep peak >= current
+            peak = max(peak, current)
+    return current, peak
+
+
+@contextmanager
+def span(name, category='stage', **args):
+    """Record the wall time and memory of a section as a trace event"""
+    if not _config['enabled']:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        rss, peak = memory_usage()
+        args = dict(args, rss_mb=rss, peak_rss_mb=peak)
+        _events.append({
+            'name': name, 'cat': category, 'ph': 'X',
+            'ts': start * 1e6, 'dur': (end - start) * 1e6,
+            'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args,
+        })
+
+
+def collect_events():
+    """Return and clear the events recorded in this process"""
+    events = list(_events)
+    _events.clear()
+    return events
+
+
+def add_events(events):
+    """Merge events recorded in worker processes"""
+    _events.extend(events)
+
+
+def write_trace(path, metadata=None):
+    """Write all recorded events as a Chrome trace JSON file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    events = sorted(_events, key=lambda e: (e['pid'], e['ts']))
+    path.write_text(json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms',
+                                'metadata': metadata or {}}, indent=1))
+    return path
+
+
+def instrument_savefig():
+    """Wrap matplotlib Figure.savefig once so every save is a 'savefig' span"""
+    global _savefig_patched
+    if _savefig_patched:
+        return
+    from matplotlib.figure import Figure
+
+    original = Figure.savefig
+
+    def savefig(self, fname, *args, **kwargs):
+        if isinstance(fname, (str, os.PathLike)):
+            name, fmt = Path(fname).name, Path(fname).suffix.lstrip('.')
+        else:
+            # In-memory buffers (e.g. FigureExport.rasterise)
+            name, fmt = type(fname).__name__, kwargs.get('format')
+        with span(f'savefig {name}', category='savefig', dpi=kwargs.get('dpi'), format=fmt):
+            return original(self, fname, *args, **kwargs)
+
+    savefig.__wrapped__ = original
+    Figure.savefig = savefig
+    _savefig_patched = True
+
+
+def _safe_name(label):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_')
+
+
+@contextmanager
+def profiled(label):
+    """
+    Profile a section if a profile mode is configured:
+    - cprofile: <profile_dir>/<label>.prof (open with pstats or snakeviz)
+    - tracemalloc: <profile_dir>/<label>.tracemalloc.txt with the top
+      allocation sites; the traced peak is also added to the trace
+    """
+    mode, profile_dir = _config['profile'], _config['profile_dir']
+    if mode is None or profile_dir is None:
+        yield
+        return
+
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    name = _safe_name(label)
+
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(profile_dir / f'{name}.prof')
+        return
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if started:
+            tracemalloc.stop()
+        lines = [f'{label}: traced peak {peak / 2 ** 20:.1f} MB', '']
+        lines += [str(stat) for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]]
+        (profile_dir / f'{name}.tracemalloc.txt').write_text('\n'.join(lines) + '\n')
+        if _events:
+            _events[-1]['args']['tracemalloc_peak_mb'] = peak / 2 ** 20
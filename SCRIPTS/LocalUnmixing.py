@@ -0,0 +1,252 @@
+"""
+Local NumPy implementation of the spectral unmixing pipeline in GEE_Script.js
+Reproduces getAutoEndmembers + image.unmix + RMSE without an Earth Engine round-trip
+
+Inputs:
+- Sentinel-2 band stacks as arrays of shape (6, ...) in BAND_ORDER
+  (B2, B3, B4, B8, B11, B12), surface reflectance scaled to 0-1
+
+Outputs:
+- Endmember spectra (soil, veg, shadow) from percentile thresholds
+- Soil / Veg / Shadow fractions, either as in GEE (clamped at 0 and
+  normalised to sum to one) or by exact fully constrained least squares
+- Per-pixel RMSE of the reconstructed spectrum
+
+Stored endmember sets can be reused across runs via
+EndmemberLibrary.endmembers_for instead of calling get_auto_endmembers;
+TiledUnmixing.unmix_tiled and ParallelUnmixing.run_unmixing_jobs take a
+library and the key parameters and only extract endmembers on a miss.
+"""
+
+import itertools
+from functools import lru_cache
+
+import numpy as np
+
+# Same band order as getAutoEndmembers in GEE_Script.js
+BAND_ORDER = ['B2', 'B3', 'B4', 'B8', 'B11', 'B12']
+FRACTION_NAMES = ['Soil', 'Veg', 'Shadow']
+
+# Percentile thresholds used for pure-pixel selection
+UPPER_PERCENTILE = 98
+LOWER_PERCENTILE = 2
+
+_B2, _B3, _B4, _B8, _B11, _B12 = range(len(BAND_ORDER))
+
+# 'gee': image.unmix().max(0) / sum; 'fcls': fully constrained least squares
+UNMIX_METHODS = ['gee', 'fcls']
+FCLS_CHUNK_PIXELS = 2 ** 20
+FEASIBLE_TOLERANCE = 1e-10
+
+
+def mask_s2_clouds(bands, qa60):
+    """
+    Equivalent of maskS2clouds: mask QA60 opaque (bit 10) and cirrus (bit 11)
+    clouds and scale DN values to reflectance. Masked pixels become NaN.
+    """
+    qa60 = np.asarray(qa60).astype(np.int64)
+    clear = ((qa60 & (1 << 10)) == 0) & ((qa60 & (1 << 11)) == 0)
+    reflectance = np.asarray(bands, dtype=np.float32) / 10000.0
+    return np.where(clear, reflectance, np.nan).astype(np.float32)
+
+
+def median_composite(stack):
+    """Per-pixel median over the time axis of a (T, 6, ...) stack (dataset.median())"""
+    return np.nanmedian(np.asarray(stack, dtype=np.float32), axis=0)
+
+
+def spectral_indices(bands):
+    """Return the NDVI, BSI and brightness images used for endmember selection"""
+    bands = np.asarray(bands, dtype=np.float32)
+    b2, b4, b8, b11 = bands[_B2], bands[_B4], bands[_B8], bands[_B11]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ndvi = (b8 - b4) / (b8 + b4)
+        bsi = ((b11 + b4) - (b8 + b2)) / ((b11 + b4) + (b8 + b2))
+    brightness = bands.sum(axis=0)
+
+    return ndvi, bsi, brightness
+
+
+def get_auto_endmembers(image):
+    """
+    Automated endmember extraction (getAutoEndmembers in GEE_Script.js)
+    - Vegetation: mean spectrum of pixels with NDVI > p98
+    - Soil: mean spectrum of pixels with BSI > p98
+    - Shadow: mean spectrum of pixels with brightness < p2
+
+    Returns a dict with 'soil', 'veg' and 'shadow' spectra in BAND_ORDER
+    and the percentile thresholds that selected them.
+    """
+    image = np.asarray(image, dtype=np.float32)
+    pixels = image.reshape(len(BAND_ORDER), -1)
+    ndvi, bsi, brightness = (index.ravel() for index in spectral_indices(image))
+
+    thresholds = {
+        'NDVI_p98': float(np.nanpercentile(ndvi, UPPER_PERCENTILE)),
+        'BSI_p98': float(np.nanpercentile(bsi, UPPER_PERCENTILE)),
+        'Bright_p2': float(np.nanpercentile(brightness, LOWER_PERCENTILE)),
+    }
+
+    def mean_spectrum(selected):
+        if not selected.any():
+            raise ValueError("No pure pixels passed the percentile threshold")
+        return np.nanmean(pixels[:, selected], axis=1)
+
+    # NaN comparisons are False, so masked pixels never count as pure
+    return {
+        'soil': mean_spectrum(bsi > thresholds['BSI_p98']),
+        'veg': mean_spectrum(ndvi > thresholds['NDVI_p98']),
+        'shadow': mean_spectrum(brightness < thresholds['Bright_p2']),
+        'thresholds': thresholds,
+    }
+
+
+def endmember_matrix(endmembers):
+    """Stack soil/veg/shadow spectra into a (bands, 3) matrix"""
+    if isinstance(endmembers, dict):
+        endmembers = [endmembers['soil'], endmembers['veg'], endmembers['shadow']]
+        return np.asarray(endmembers, dtype=np.float64).T
+    return np.asarray(endmembers, dtype=np.float64)
+
+
+@lru_cache(maxsize=64)
+def _cached_pinv(matrix_bytes, shape):
+    matrix = np.frombuffer(matrix_bytes, dtype=np.float64).reshape(shape)
+    pinv = np.linalg.pinv(matrix)
+    pinv.setflags(write=False)
+    return pinv
+
+
+def endmember_pinv(endmembers):
+    """Pseudo-inverse of the endmember matrix, cached per matrix"""
+    matrix = np.ascontiguousarray(endmember_matrix(endmembers))
+    return _cached_pinv(matrix.tobytes(), matrix.shape)
+
+
+def unmix(bands, endmembers):
+    """
+    Unmix every pixel of a band stack in one batched least-squares solve
+    Mirrors image.unmix(endmemberList).max(0) followed by division by the sum.
+
+    bands: array of shape (6, ...) in BAND_ORDER
+    Returns fractions of shape (3, ...) in FRACTION_NAMES order.
+    """
+    bands = np.asarray(bands, dtype=np.float32)
+    spatial_shape = bands.shape[1:]
+    pixels = bands.reshape(bands.shape[0], -1)
+
+    pinv = endmember_pinv(endmembers).astype(np.float32)
+    unmixed = np.maximum(pinv @ pixels, 0)
+
+    # Pixels whose clamped fractions sum to zero are masked, as in GEE
+    total = unmixed.sum(axis=0, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fractions = np.where(total > 0, unmixed / total, np.nan)
+
+    return fractions.reshape((len(FRACTION_NAMES),) + spatial_shape)
+
+
+@lru_cache(maxsize=64)
+def _cached_fcls_maps(matrix_bytes, shape):
+    """
+    Sum-to-one least-squares solution on every endmember subset (support),
+    largest first. On a support S the solution is affine in the pixel:
+    f_S = A x + b with A = P - g (1'P) / s, b = g / s, where P = pinv(E_S),
+    g = (E_S'E_S)^-1 1 and s = 1'g.
+    """
+    matrix = np.frombuffer(matrix_bytes, dtype=np.float64).reshape(shape)
+    n_endmembers = shape[1]
+    maps = []
+    for size in range(n_endmembers, 0, -1):
+        for support in itertools.combinations(range(n_endmembers), size):
+            sub = matrix[:, support]
+            p = np.linalg.pinv(sub)
+            g = np.linalg.pinv(sub.T @ sub).sum(axis=1)
+            a = p - np.outer(g, p.sum(axis=0)) / g.sum()
+            maps.append((list(support), a, g / g.sum()))
+    return tuple(maps)
+
+
+def _fcls_block(x, matrix, maps):
+    """FCLS fractions for a (bands, P) float64 block of pixels"""
+    _, a, b = maps[0]
+    fractions = a @ x + b[:, None]
+
+    # Early exit: where the all-endmember solution is already non-negative
+    # it is the constrained optimum. NaN pixels stay NaN.
+    pending = ~(fractions >= -FEASIBLE_TOLERANCE).all(axis=0) & ~np.isnan(x).any(axis=0)
+    if pending.any():
+        x = x[:, pending]
+        best = np.zeros((matrix.shape[1], x.shape[1]))
+        best_err = np.full(x.shape[1], np.inf)
+        # The problem is convex, so the optimum is the feasible support
+        # solution with the smallest residual
+        for support, a, b in maps[1:]:
+            f = a @ x + b[:, None]
+            err = ((matrix[:, support] @ f - x) ** 2).sum(axis=0)
+            better = (f >= -FEASIBLE_TOLERANCE).all(axis=0) & (err < best_err)
+            best_err[better] = err[better]
+            best[:, better] = 0
+            best[np.ix_(support, better.nonzero()[0])] = f[:, better]
+        fractions[:, pending] = best
+
+    return np.maximum(fractions, 0, where=~np.isnan(fractions), out=fractions)
+
+
+def unmix_fcls(bands, endmembers, chunk_pixels=FCLS_CHUNK_PIXELS):
+    """
+    Exact fully constrained least squares (fractions >= 0, sum to one)
+    Every pixel is solved with batched matrix products: first on all
+    endmembers (pixels that come out non-negative are done), then the
+    remaining pixels on each smaller endmember subset, keeping the
+    feasible solution with the lowest residual. Pixels are processed in
+    chunks of chunk_pixels to bound memory.
+
+    bands: array of shape (6, ...) in BAND_ORDER
+    Returns fractions of shape (3, ...) in FRACTION_NAMES order.
+    """
+    bands = np.asarray(bands, dtype=np.float32)
+    spatial_shape = bands.shape[1:]
+    pixels = bands.reshape(bands.shape[0], -1)
+
+    matrix = np.ascontiguousarray(endmember_matrix(endmembers))
+    maps = _cached_fcls_maps(matrix.tobytes(), matrix.shape)
+
+    fractions = np.empty((matrix.shape[1], pixels.shape[1]), dtype=np.float32)
+    for start in range(0, pixels.shape[1], chunk_pixels):
+        stop = start + chunk_pixels
+        block = pixels[:, start:stop].astype(np.float64)
+        fractions[:, start:stop] = _fcls_block(block, matrix, maps)
+
+    return fractions.reshape((matrix.shape[1],) + spatial_shape)
+
+
+def reconstruction_rmse(bands, fractions, endmembers):
+    """Per-pixel RMSE between observed and reconstructed (E @ f) spectra"""
+    bands = np.asarray(bands, dtype=np.float32)
+    spatial_shape = bands.shape[1:]
+    pixels = bands.reshape(bands.shape[0], -1)
+    fractions = np.asarray(fractions, dtype=np.float32).reshape(len(FRACTION_NAMES), -1)
+
+    modeled = endmember_matrix(endmembers).astype(np.float32) @ fractions
+    rmse = np.sqrt(np.mean((pixels - modeled) ** 2, axis=0))
+
+    return rmse.reshape(spatial_shape)
+
+
+def process_scene(bands, endmembers, method='gee'):
+    """
+    Unmix a scene and compute its reconstruction error
+    method: 'gee' (clamp and normalise, as GEE_Script.js) or 'fcls'
+    Returns a dict of 'Soil', 'Veg', 'Shadow' and 'RMSE' arrays.
+    """
+    if method == 'gee':
+        fractions = unmix(bands, endmembers)
+    elif method == 'fcls':
+        fractions = unmix_fcls(bands, endmembers)
+    else:
+        raise ValueError(f"Unknown unmixing method '{method}'")
+    result = dict(zip(FRACTION_NAMES, fractions))
+    result['RMSE'] = reconstruction_rmse(bands, fractions, endmembers)
+    return result
@@ -0,0 +1,310 @@
+"""
+Process-pool scheduler for unmixing many (site, scene) jobs
+Replaces the sequential Object.keys(sites).forEach loop of GEE_Script.js
+
+Inputs:
+- Jobs of (site, system:time_start, band stack) where the band stack is a
+  .npy path, an np.memmap (or a view of one) or an in-memory (6, rows, cols) array
+- Endmember matrix per site, or an EndmemberLibrary plus each site's
+  library key parameters (geometry, start, end)
+
+Outputs:
+- One row per job with region-mean Soil/Veg/Shadow/RMSE, in job order
+- Per-site CSVs in the DATA/ layout read by GenerateCharts.load_data
+- Optionally the full-resolution rasters of every scene (FractionRasters.py)
+
+Each scene is split into TiledUnmixing windows and every (scene, window)
+pair is a pool task, so a worker only holds one window at a time. Workers
+return per-window sums and valid-pixel counts, which are combined into the
+region means. Paths and memory maps are opened by the workers themselves;
+windows of in-memory stacks are sent with their task, and only a few tasks
+per worker are in flight at once.
+"""
+
+import mmap
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import FractionRasters
+from DataIngestion import export_filenames
+from LocalUnmixing import FRACTION_NAMES, endmember_matrix, median_composite, process_scene
+from TiledUnmixing import (DEFAULT_TILE_SIZE, OUTPUT_NAMES, create_output_rasters,
+                           iter_windows, open_band_stack)
+
+# Picklable handle to an array living in a shared memory block
+SharedArraySpec = namedtuple('SharedArraySpec', ['name', 'shape', 'dtype'])
+
+# Picklable handle to a (possibly strided) view into a memory-mapped file:
+# the mapped byte range of the file plus the view's offset, shape and strides
+MemmapSpec = namedtuple('MemmapSpec', ['filename', 'offset', 'nbytes', 'view_offset',
+                                       'shape', 'strides', 'dtype'])
+
+UnmixJob = namedtuple('UnmixJob', ['site', 'time_start', 'bands'])
+
+# Tasks in flight per worker; bounds the windows of in-memory stacks held in the queue
+TASKS_PER_WORKER = 2
+
+
+def share_array(array):
+    """Copy an array into a new shared memory block; returns (block, spec)"""
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    view[...] = array
+    return block, SharedArraySpec(block.name, array.shape, array.dtype.str)
+
+
+def attach_array(spec):
+    """Attach to a shared array without copying; returns (block, view)"""
+    block = shared_memory.SharedMemory(name=spec.name)
+    view = np.ndarray(spec.shape, dtype=np.dtype(spec.dtype), buffer=block.buf)
+    return block, view
+
+
+def _memmap_root(array):
+    """The np.memmap owning the file mapping an array is a view of, or None"""
+    root = array
+    while isinstance(root.base, np.ndarray):
+        root = root.base
+    if isinstance(root, np.memmap) and isinstance(root.base, mmap.mmap):
+        return root
+    return None
+
+
+def memmap_spec(array):
+    """Describe a memmap or any view of one (slices included) for a worker"""
+    root = _memmap_root(array)
+    if root is None:
+        raise ValueError("Array is not backed by a memory-mapped file")
+    view_offset = array.__array_interface__['data'][0] - root.__array_interface__['data'][0]
+    return MemmapSpec(str(root.filename), root.offset, root.nbytes, view_offset,
+                      array.shape, array.strides, array.dtype.str)
+
+
+def open_memmap_spec(spec):
+    """Re-open the exact view described by memmap_spec, read-only"""
+    raw = np.memmap(spec.filename, dtype=np.uint8, mode='r', offset=spec.offset,
+                    shape=(spec.nbytes,))
+    return np.ndarray(spec.shape, dtype=np.dtype(spec.dtype), buffer=raw,
+                      offset=spec.view_offset, strides=spec.strides)
+
+
+def _band_source(bands):
+    """Turn a job's bands into something cheap to send to a worker, plus its shape"""
+    if isinstance(bands, np.ndarray):
+        if _memmap_root(bands) is not None:
+            return memmap_spec(bands), bands.shape
+        # In-memory stacks are sent window by window with their tasks
+        return bands, bands.shape
+    stack = open_band_stack(bands)
+    return str(bands), stack.shape
+
+
+def _read_window(source, window):
+    """Read one (6, rows, cols) window of a band source"""
+    if isinstance(source, MemmapSpec):
+        bands = open_memmap_spec(source)
+    else:
+        bands = open_band_stack(source)
+    return np.array(bands[(slice(None),) + window], dtype=np.float32)
+
+
+def _run_window(task):
+    """
+    Worker: unmix one window of a scene; returns the job index and the
+    per-output sums and valid-pixel counts (ee.Reducer.mean() ignores
+    masked pixels), optionally writing the window into scratch rasters
+    """
+    index, band_source, window, endmember_spec, scratch, method = task
+
+    em_block, endmembers = attach_array(endmember_spec)
+    try:
+        if isinstance(band_source, np.ndarray):
+            block = band_source
+        else:
+            block = _read_window(band_source, window)
+        result = process_scene(block, endmembers, method)
+    finally:
+        # Drop the view before closing so the buffer can be released
+        del endmembers
+        em_block.close()
+
+    if scratch is not None:
+        for name in OUTPUT_NAMES:
+            raster = np.load(Path(scratch) / f'{name}.npy', mmap_mode='r+')
+            raster[window] = result[name]
+            raster.flush()
+            del raster
+
+    values = np.stack([result[name] for name in OUTPUT_NAMES]).reshape(len(OUTPUT_NAMES), -1)
+    valid = ~np.isnan(values)
+    sums = np.where(valid, values, 0).sum(axis=1, dtype=np.float64)
+    return index, sums, valid.sum(axis=1)
+
+
+def library_endmembers(jobs, library, site_keys, save=True):
+    """
+    Endmembers of each site in site_keys from an EndmemberLibrary
+    site_keys: dict of site -> (geometry, start, end) library key parameters
+    Only on a library miss is the reference image built, as the median
+    composite of the site's job scenes (the whole stacks are read).
+    Returns a dict of site -> endmember dict.
+    """
+    site_endmembers = {}
+    for site, (geometry, start, end) in site_keys.items():
+        stacks = [job.bands for job in jobs if job.site == site]
+
+        def reference_image(stacks=stacks):
+            return median_composite(np.stack([
+                open_band_stack(bands) if isinstance(bands, (str, Path)) else bands
+                for bands in stacks]))
+
+        site_endmembers[site] = library.endmembers_for(site, geometry, start, end,
+                                                       reference_image, save=False)
+    if save:
+        library.save()
+    return site_endmembers
+
+
+def run_unmixing_jobs(jobs, site_endmembers=None, max_workers=None, raster_root=None,
+                      method='gee', tile_size=DEFAULT_TILE_SIZE, library=None,
+                      site_keys=None):
+    """
+    Spread unmixing jobs over a ProcessPoolExecutor, one task per window
+
+    jobs: iterable of UnmixJob (or (site, time_start, bands) tuples)
+    site_endmembers: dict of site -> endmember dict or (bands, 3) matrix
+    library, site_keys: EndmemberLibrary and dict of site -> (geometry,
+        start, end); endmembers of these sites are read from the library
+        instead of being passed in (see library_endmembers)
+    max_workers: worker processes (defaults to os.cpu_count())
+    raster_root: if given, each scene's Soil/Veg/Shadow/RMSE rasters are
+        also kept there as chunked, compressed arrays (windows are written
+        into scratch memmaps under raster_root until the scene is complete)
+    method: 'gee' or 'fcls' (see LocalUnmixing.process_scene)
+    tile_size: window size, as in TiledUnmixing.unmix_tiled
+
+    Endmember matrices are placed in shared memory once and workers attach
+    to them. Results are returned in job order, so output CSVs are
+    deterministic.
+    """
+    jobs = [UnmixJob(*job) for job in jobs]
+    site_endmembers = dict(site_endmembers or {})
+    if library is not None:
+        site_endmembers.update(library_endmembers(jobs, library, site_keys or {}))
+    max_workers = max_workers or os.cpu_count() or 1
+    sums = np.zeros((len(jobs), len(OUTPUT_NAMES)))
+    counts = np.zeros((len(jobs), len(OUTPUT_NAMES)), dtype=np.int64)
+    remaining = {}
+    blocks = []
+    scratch_root = None
+
+    def window_tasks():
+        for index, job in enumerate(jobs):
+            band_source, shape = _band_source(job.bands)
+            if len(shape) != 3:
+                raise ValueError(f"Expected a (bands, rows, cols) stack, got {shape}")
+            windows = list(iter_windows(*shape[1:], tile_size))
+            remaining[index] = len(windows)
+            scratch = None
+            if scratch_root is not None:
+                scratch = scratch_root / str(index)
+                create_output_rasters(scratch, shape[1:])
+                scratch = str(scratch)
+            for window in windows:
+                source = band_source
+                if isinstance(band_source, np.ndarray):
+                    source = np.ascontiguousarray(band_source[(slice(None),) + window],
+                                                  dtype=np.float32)
+                yield (index, source, window, em_specs[job.site], scratch, method)
+
+    def collect(future):
+        index, window_sums, window_counts = future.result()
+        sums[index] += window_sums
+        counts[index] += window_counts
+        remaining[index] -= 1
+        if remaining[index] == 0 and scratch_root is not None:
+            scratch = scratch_root / str(index)
+            rasters = {name: np.load(scratch / f'{name}.npy', mmap_mode='r')
+                       for name in OUTPUT_NAMES}
+            FractionRasters.write_scene(raster_root, jobs[index].site,
+                                        jobs[index].time_start, rasters)
+            del rasters
+            shutil.rmtree(scratch)
+
+    try:
+        em_specs = {}
+        for site, endmembers in site_endmembers.items():
+            block, spec = share_array(endmember_matrix(endmembers))
+            blocks.append(block)
+            em_specs[site] = spec
+
+        if raster_root is not None:
+            Path(raster_root).mkdir(parents=True, exist_ok=True)
+            scratch_root = Path(tempfile.mkdtemp(prefix='.scratch-', dir=raster_root))
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = set()
+            for task in window_tasks():
+                if len(pending) >= TASKS_PER_WORKER * max_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+                pending.add(executor.submit(_run_window, task))
+            for future in wait(pending).done:
+                collect(future)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        if scratch_root is not None:
+            shutil.rmtree(scratch_root, ignore_errors=True)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    results = pd.DataFrame(means, columns=OUTPUT_NAMES)
+    results.insert(0, 'system:time_start', [job.time_start for job in jobs])
+    results.insert(0, 'site', [job.site for job in jobs])
+    return results
+
+
+def format_gee_date(timestamp):
+    """Format a date like the GEE chart export ("Jan 1, 2023")"""
+    timestamp = pd.Timestamp(timestamp)
+    return f"{timestamp:%b} {timestamp.day}, {timestamp.year}"
+
+
+def write_site_csvs(results, output_dir):
+    """
+    Write per-site CSVs in the DATA/ layout (DataIngestion.export_filenames):
+    - <Site> Soil Veg and Shadow Dynamics.csv
+    - <Site> Model Accuracy RMSE.csv (Narok_Crops: Model Accuracy_RMSE.csv)
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+
+    for site, site_rows in results.groupby('site', sort=True):
+        site_rows = site_rows.sort_values('system:time_start', kind='stable').copy()
+        site_rows['system:time_start'] = site_rows['system:time_start'].map(format_gee_date)
+
+        dynamics_name, rmse_name = export_filenames(site)
+        dynamics_path = output_dir / dynamics_name
+        site_rows[['system:time_start'] + FRACTION_NAMES].to_csv(
+            dynamics_path, index=False, float_format='%.3f')
+
+        rmse_path = output_dir / rmse_name
+        site_rows[['system:time_start', 'RMSE']].to_csv(
+            rmse_path, index=False, float_format='%.3f')
+
+        written.extend([dynamics_path, rmse_path])
+
+    return written
@@ -0,0 +1,302 @@
+"""
+Incrementally maintained per-site RMSE statistics
+Feeds the RMSE box plot, the Figure 4 stats boxes and Table 1 without
+re-reading the raw series on every run
+
+Per site it keeps:
+- count, mean and variance (Welford), min, max, count <= GOOD_FIT_THRESHOLD
+- a quantile sketch for median and box-plot quartiles: exact while the
+  site has at most EXACT_LIMIT observations, then a fixed-width histogram
+  (constant memory, resolution HISTOGRAM_BIN_WIDTH)
+- the latest system:time_start seen, so appends skip known observations
+
+The index is saved as JSON together with the source it was built from
+(source_key); loading it against a different source starts a fresh index.
+Summaries cost the same regardless of history length.
+"""
+
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+GOOD_FIT_THRESHOLD = 0.10
+EXACT_LIMIT = 10000
+HISTOGRAM_MAX = 1.0
+HISTOGRAM_BIN_WIDTH = 1e-4
+WHISKER_RANGE = 1.5  # matplotlib boxplot default
+
+
+class QuantileSketch:
+    """Exact quantiles for small samples, fixed-width histogram beyond EXACT_LIMIT"""
+
+    n_bins = int(round(HISTOGRAM_MAX / HISTOGRAM_BIN_WIDTH))
+
+    def __init__(self):
+        self.values = []
+        self.counts = None
+
+    @property
+    def exact(self):
+        return self.counts is None
+
+    def __len__(self):
+        return len(self.values) if self.exact else int(self.counts.sum())
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if self.exact:
+            self.values.extend(values.tolist())
+            if len(self.values) > EXACT_LIMIT:
+                self._to_histogram()
+        else:
+            self._bin(values)
+
+    def merge(self, other):
+        """Combine two sketches (used for the overall row)"""
+        merged = QuantileSketch()
+        if self.exact and other.exact:
+            merged.add(self.values + other.values)
+            return merged
+        merged.counts = np.zeros(self.n_bins, dtype=np.int64)
+        for sketch in (self, other):
+            if sketch.exact:
+                merged._bin(np.asarray(sketch.values))
+            else:
+                merged.counts += sketch.counts
+        return merged
+
+    def _to_histogram(self):
+        values = np.asarray(self.values)
+        self.values = []
+        self.counts = np.zeros(self.n_bins, dtype=np.int64)
+        self._bin(values)
+
+    def _bin(self, values):
+        idx = np.clip((values / HISTOGRAM_BIN_WIDTH).astype(np.int64), 0, self.n_bins - 1)
+        self.counts += np.bincount(idx, minlength=self.n_bins)
+
+    def quantile(self, q):
+        """Quantile with linear interpolation (np.percentile default); NaN if empty"""
+        if not len(self):
+            return math.nan
+        if self.exact:
+            return float(np.quantile(self.values, q))
+        cumulative = np.cumsum(self.counts)
+        target = q * (cumulative[-1] - 1)
+        b = int(np.searchsorted(cumulative, target, side='right'))
+        # Interpolate inside the bin by rank
+        below = cumulative[b - 1] if b > 0 else 0
+        frac = (target - below + 0.5) / self.counts[b]
+        return float((b + min(max(frac, 0.0), 1.0)) * HISTOGRAM_BIN_WIDTH)
+
+    def whiskers_and_fliers(self, lower_fence, upper_fence):
+        """Whisker ends (data extremes inside the fences) and outliers"""
+        if not len(self):
+            return math.nan, math.nan, np.empty(0)
+        if self.exact:
+            values = np.asarray(self.values)
+            inside = values[(values >= lower_fence) & (values <= upper_fence)]
+            fliers = values[(values < lower_fence) | (values > upper_fence)]
+            return float(inside.min()), float(inside.max()), fliers
+        centers = (np.flatnonzero(self.counts) + 0.5) * HISTOGRAM_BIN_WIDTH
+        inside = centers[(centers >= lower_fence) & (centers <= upper_fence)]
+        fliers = centers[(centers < lower_fence) | (centers > upper_fence)]
+        return float(inside.min()), float(inside.max()), fliers
+
+    def to_dict(self):
+        if self.exact:
+            return {'values': self.values}
+        nonzero = np.flatnonzero(self.counts)
+        return {'bins': nonzero.tolist(), 'counts': self.counts[nonzero].tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        sketch = cls()
+        if 'values' in d:
+            sketch.values = list(d['values'])
+        else:
+            sketch.counts = np.zeros(cls.n_bins, dtype=np.int64)
+            sketch.counts[d['bins']] = d['counts']
+        return sketch
+
+
+class SiteStatistics:
+    """Running RMSE aggregates for one site"""
+
+    def __init__(self):
+        self.count = 0
+        self._mean = 0.0
+        self.m2 = 0.0
+        self._min = math.inf
+        self._max = -math.inf
+        self.n_good = 0
+        self.last_time = None
+        self.sketch = QuantileSketch()
+
+    def append(self, values, times=None):
+        """
+        Add new observations; rows at or before last_time are skipped
+        when times are given. Returns the number of observations added.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if times is not None:
+            times = pd.to_datetime(pd.Series(times)).to_numpy()
+            if self.last_time is not None:
+                newer = times > np.datetime64(self.last_time)
+                values, times = values[newer], times[newer]
+        keep = ~np.isnan(values)
+        values = values[keep]
+        if times is not None and len(times[keep]):
+            self.last_time = pd.Timestamp(times[keep].max()).isoformat()
+        if not len(values):
+            return 0
+
+        # Chan et al. parallel update of mean and M2
+        n, batch_mean = len(values), float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+        total = self.count + n
+        delta = batch_mean - self._mean
+        self._mean += delta * n / total
+        self.m2 += batch_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+        self._min = min(self._min, float(values.min()))
+        self._max = max(self._max, float(values.max()))
+        self.n_good += int((values <= GOOD_FIT_THRESHOLD).sum())
+        self.sketch.add(values)
+        return n
+
+    def merge(self, other):
+        merged = SiteStatistics()
+        total = self.count + other.count
+        if total:
+            delta = other._mean - self._mean
+            merged._mean = self._mean + delta * other.count / total
+            merged.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / total
+        merged.count = total
+        merged._min = min(self._min, other._min)
+        merged._max = max(self._max, other._max)
+        merged.n_good = self.n_good + other.n_good
+        merged.sketch = self.sketch.merge(other.sketch)
+        return merged
+
+    # Sites without observations report NaN, as pandas does for an empty series
+    @property
+    def mean(self):
+        return self._mean if self.count else math.nan
+
+    @property
+    def min(self):
+        return self._min if self.count else math.nan
+
+    @property
+    def max(self):
+        return self._max if self.count else math.nan
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1, as pandas)"""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    @property
+    def median(self):
+        return self.sketch.quantile(0.5)
+
+    @property
+    def pct_good(self):
+        return self.n_good / self.count * 100 if self.count else math.nan
+
+    def summary(self):
+        return {
+            'n': self.count, 'mean': self.mean, 'median': self.median,
+            'std': self.std, 'min': self.min, 'max': self.max,
+            'pct_good': self.pct_good,
+        }
+
+    def boxplot_stats(self, label=None):
+        """Statistics dict accepted by matplotlib Axes.bxp (NaN box if empty)"""
+        if not self.count:
+            return {'label': label, 'mean': math.nan, 'med': math.nan,
+                    'q1': math.nan, 'q3': math.nan, 'whislo': math.nan,
+                    'whishi': math.nan, 'fliers': np.empty(0)}
+        q1, med, q3 = (self.sketch.quantile(q) for q in (0.25, 0.5, 0.75))
+        iqr = q3 - q1
+        whislo, whishi, fliers = self.sketch.whiskers_and_fliers(
+            q1 - WHISKER_RANGE * iqr, q3 + WHISKER_RANGE * iqr)
+        return {'label': label, 'mean': self.mean, 'med': med, 'q1': q1, 'q3': q3,
+                'whislo': whislo, 'whishi': whishi, 'fliers': fliers}
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self._mean, 'm2': self.m2,
+                'min': self._min, 'max': self._max, 'n_good': self.n_good,
+                'last_time': self.last_time, 'sketch': self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        stats = cls()
+        for key in ('count', 'm2', 'n_good', 'last_time'):
+            setattr(stats, key, d[key])
+        stats._mean, stats._min, stats._max = d['mean'], d['min'], d['max']
+        stats.sketch = QuantileSketch.from_dict(d['sketch'])
+        return stats
+
+
+def source_key(kind, path):
+    """Identify the raw series an index is built from, e.g. ('store', STORE_DIR)"""
+    return f'{kind}:{Path(path).resolve()}'
+
+
+class StatisticsIndex:
+    """
+    Per-site SiteStatistics, persisted as JSON
+    source names the raw series the index was built from (see load)
+    """
+
+    def __init__(self, sites=None, source=None):
+        self.sites = dict(sites or {})
+        self.source = source
+
+    def __getitem__(self, site):
+        return self.sites[site]
+
+    def __contains__(self, site):
+        return site in self.sites
+
+    def append(self, site, values, times=None):
+        return self.sites.setdefault(site, SiteStatistics()).append(values, times)
+
+    def update_from_table(self, site, table, column='RMSE', time_column='system:time_start'):
+        """Append only the rows of a site table newer than its last_time"""
+        return self.append(site, table[column].to_numpy(), table[time_column])
+
+    def overall(self, sites=None):
+        merged = SiteStatistics()
+        for site in sites or self.sites:
+            merged = merged.merge(self.sites[site])
+        return merged
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {'source': self.source,
+                   'sites': {site: stats.to_dict() for site, stats in self.sites.items()}}
+        path.write_text(json.dumps(payload))
+
+    @classmethod
+    def load(cls, path, source=None):
+        """
+        Load a saved index; when source is given and the index was built from
+        different data (or does not record its source), start a fresh index
+        instead, so appends never mix two sources' observations
+        """
+        path = Path(path)
+        if not path.exists():
+            return cls(source=source)
+        payload = json.loads(path.read_text())
+        if source is not None and payload.get('source') != source:
+            return cls(source=source)
+        return cls({site: SiteStatistics.from_dict(d) for site, d in payload['sites'].items()},
+                   payload['source'])
@@ -0,0 +1,154 @@
+"""
+Streaming append mode for new Sentinel-2 acquisitions
+Adds the week's new scenes to the site time series without re-exporting
+the full startDate/endDate window of GEE_Script.js
+
+Inputs:
+- New scenes as band stacks <scenes>/<Site>/<YYYY-MM-DD>.npy (6, rows, cols)
+  in BAND_ORDER, reflectance scaled to 0-1 (cloud-masked pixels NaN)
+- The FractionStore holding each site's series so far
+- The EndmemberLibrary holding each site's endmembers
+
+Outputs:
+- Soil/Veg/Shadow/RMSE region means for scenes newer than the site's last
+  stored system:time_start, upserted into the store
+- Optionally the scene rasters (FractionRasters.py) and the persisted RMSE
+  statistics index (SiteStatistics.py), updated with the new rows only
+- Optionally an incremental GenerateCharts run, which re-renders only the
+  figures whose site data changed
+
+Only the new scene files are opened and only the newest year partition
+of each site is rewritten, so the cost follows the number of new scenes
+rather than the length of the history.
+
+Usage:
+    python StreamingAppend.py --store STORE --library endmembers.json --scenes NEW_SCENES
+    python StreamingAppend.py --store STORE --library endmembers.json --scenes NEW_SCENES \\
+        --stats-index IMAGES/rmse_stats.json --render
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+import FractionStore
+from DataIngestion import TIME_COLUMN, VALUE_COLUMNS
+from EndmemberLibrary import EndmemberLibrary
+from LocalUnmixing import UNMIX_METHODS
+from ParallelUnmixing import UnmixJob, run_unmixing_jobs
+from SiteStatistics import StatisticsIndex, source_key
+
+
+def scene_date(path):
+    """Acquisition date from a scene file name (YYYY-MM-DD or YYYYMMDD)"""
+    return pd.Timestamp(Path(path).stem)
+
+
+def pending_scenes(scenes_dir, site, after=None):
+    """Scene files of a site newer than after, oldest first: [(date, path)]"""
+    site_dir = Path(scenes_dir) / site
+    scenes = sorted((scene_date(path), path) for path in site_dir.glob('*.npy'))
+    if after is not None:
+        scenes = [(date, path) for date, path in scenes if date > after]
+    return scenes
+
+
+def append_scenes(store_dir, library, scenes_dir, sites=None, raster_root=None,
+                  stats_index=None, max_workers=None, method='gee'):
+    """
+    Unmix and append every site's scenes newer than its last stored date
+
+    library: EndmemberLibrary; each site's most recent endmember set is used
+    sites: sites to update (default: every site directory under scenes_dir)
+    stats_index: optional StatisticsIndex updated with the new RMSE rows
+    method: unmixing method, 'gee' or 'fcls' (use the one the history used)
+
+    Returns the new rows (site, system:time_start, Soil, Veg, Shadow, RMSE).
+    """
+    if sites is None:
+        sites = sorted(path.name for path in Path(scenes_dir).iterdir() if path.is_dir())
+
+    jobs, site_endmembers = [], {}
+    for site in sites:
+        scenes = pending_scenes(scenes_dir, site, FractionStore.last_time(store_dir, site))
+        if not scenes:
+            continue
+        endmembers = library.latest_for_site(site)
+        if endmembers is None:
+            raise ValueError(f"No stored endmembers for site '{site}'; "
+                             "build them with EndmemberLibrary.endmembers_for first")
+        site_endmembers[site] = endmembers
+        jobs.extend(UnmixJob(site, date, path) for date, path in scenes)
+
+    if not jobs:
+        return pd.DataFrame(columns=['site', TIME_COLUMN] + VALUE_COLUMNS)
+
+    results = run_unmixing_jobs(jobs, site_endmembers, max_workers=max_workers,
+                                raster_root=raster_root, method=method)
+    results[TIME_COLUMN] = pd.to_datetime(results[TIME_COLUMN])
+
+    for site, rows in results.groupby('site', sort=True):
+        table = rows.drop(columns='site').reset_index(drop=True)
+        FractionStore.write_site_table(store_dir, site, table)
+        if stats_index is not None:
+            stats_index.update_from_table(site, table)
+
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--store', type=Path, required=True,
+                        help='FractionStore directory holding the site series')
+    parser.add_argument('--library', type=Path, required=True,
+                        help='EndmemberLibrary JSON file with the sites\' endmembers')
+    parser.add_argument('--scenes', type=Path, required=True,
+                        help='directory of new scenes, <Site>/<YYYY-MM-DD>.npy')
+    parser.add_argument('--sites', nargs='+', default=None,
+                        help='sites to update (default: all site directories in --scenes)')
+    parser.add_argument('--rasters', type=Path, default=None,
+                        help='also keep the scene rasters under this FractionRasters root')
+    parser.add_argument('--stats-index', type=Path, default=None,
+                        help='persisted RMSE statistics index to update')
+    parser.add_argument('--method', choices=UNMIX_METHODS, default='gee',
+                        help="unmixing method: 'gee' clamp-and-normalise or exact 'fcls'")
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='unmixing worker processes (default: CPU count)')
+    parser.add_argument('--render', action='store_true',
+                        help='then re-render the affected figures (GenerateCharts --incremental)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    library = EndmemberLibrary(args.library)
+    stats_index = None
+    if args.stats_index is not None:
+        stats_index = StatisticsIndex.load(args.stats_index, source_key('store', args.store))
+
+    results = append_scenes(args.store, library, args.scenes, args.sites,
+                            raster_root=args.rasters, stats_index=stats_index,
+                            max_workers=args.jobs, method=args.method)
+    library.save()
+    if stats_index is not None:
+        stats_index.save(args.stats_index)
+
+    if results.empty:
+        print("✓ No new scenes")
+    for site, rows in results.groupby('site', sort=True):
+        print(f"✓ {site}: appended {len(rows)} scene(s) up to "
+              f"{rows[TIME_COLUMN].max():%Y-%m-%d}")
+
+    if args.render:
+        import GenerateCharts
+        chart_args = ['--store', str(args.store), '--incremental']
+        if args.stats_index is not None:
+            chart_args += ['--stats-index', str(args.stats_index)]
+        GenerateCharts.main(chart_args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Tiled, memory-mapped scene unmixing for full Sentinel-2 tiles
+Streams fixed-size windows from disk so peak memory depends on the tile
+size rather than the scene size (a 10980 x 10980 x 6 float32 tile is ~2.9 GB)
+
+Inputs:
+- Band stack as .npy or raw binary file with shape (6, rows, cols) in BAND_ORDER
+
+Outputs:
+- Soil.npy, Veg.npy, Shadow.npy, RMSE.npy memory-mapped float32 rasters
+- Optionally the same rasters as chunked, compressed FractionRasters with
+  overview levels (raster_root), as kept by ParallelUnmixing
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import FractionRasters
+from LocalUnmixing import BAND_ORDER, FRACTION_NAMES, process_scene
+
+OUTPUT_NAMES = FRACTION_NAMES + ['RMSE']
+DEFAULT_TILE_SIZE = 1024
+
+
+def open_band_stack(path, shape=None, dtype=np.float32):
+    """
+    Memory-map a band stack without reading it into RAM
+    .npy files carry their own shape; raw files need shape=(6, rows, cols).
+    """
+    path = Path(path)
+    if path.suffix == '.npy':
+        stack = np.load(path, mmap_mode='r')
+    else:
+        if shape is None:
+            raise ValueError(f"shape is required for raw band stack {path}")
+        stack = np.memmap(path, dtype=dtype, mode='r', shape=tuple(shape))
+
+    if stack.ndim != 3 or stack.shape[0] != len(BAND_ORDER):
+        raise ValueError(f"Expected a ({len(BAND_ORDER)}, rows, cols) stack, got {stack.shape}")
+    return stack
+
+
+def create_output_rasters(output_dir, shape):
+    """Pre-allocate memory-mapped Soil/Veg/Shadow/RMSE .npy rasters"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return {
+        name: np.lib.format.open_memmap(output_dir / f'{name}.npy', mode='w+',
+                                        dtype=np.float32, shape=tuple(shape))
+        for name in OUTPUT_NAMES
+    }
+
+
+def iter_windows(rows, cols, tile_size=DEFAULT_TILE_SIZE):
+    """Yield (row_slice, col_slice) windows covering a rows x cols raster"""
+    for row in range(0, rows, tile_size):
+        for col in range(0, cols, tile_size):
+            yield (slice(row, min(row + tile_size, rows)),
+                   slice(col, min(col + tile_size, cols)))
+
+
+def unmix_tiled(bands, endmembers, output_dir, tile_size=DEFAULT_TILE_SIZE, method='gee',
+                raster_root=None, site=None, time_start=None, library=None, library_key=None):
+    """
+    Unmix a memory-mapped band stack one window at a time
+    Each window is read, unmixed, scored and written straight into the
+    pre-allocated output rasters, so only one tile is resident at a time.
+
+    bands: array-like or path accepted by open_band_stack
+    endmembers: endmember dict or matrix; None to read them from library
+        (EndmemberLibrary) with library_key=(geometry, start, end) of site,
+        extracting them from this scene only on a library miss
+    method: 'gee' or 'fcls' (see LocalUnmixing.process_scene)
+    raster_root: also store the scene as FractionRasters under
+        <raster_root>/<site>/<YYYYMMDD> (site and time_start required);
+        with output_dir=None the .npy rasters are only scratch space
+    Returns the dict of output memmaps, or the FractionRasters scene path
+    when output_dir is None.
+    """
+    if raster_root is not None and (site is None or time_start is None):
+        raise ValueError("site and time_start are required with raster_root")
+    if endmembers is None:
+        if library is None or library_key is None or site is None:
+            raise ValueError("endmembers, or library, library_key and site, are required")
+        geometry, start, end = library_key
+        endmembers = library.endmembers_for(
+            site, geometry, start, end,
+            lambda: open_band_stack(bands) if isinstance(bands, (str, Path)) else bands)
+    if output_dir is None:
+        if raster_root is None:
+            raise ValueError("output_dir or raster_root is required")
+        Path(raster_root).mkdir(parents=True, exist_ok=True)
+        scratch = tempfile.mkdtemp(prefix='.scratch-', dir=raster_root)
+        try:
+            outputs = unmix_tiled(bands, endmembers, scratch, tile_size, method)
+            path = FractionRasters.write_scene(raster_root, site, time_start, outputs)
+            del outputs
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        return path
+
+    if isinstance(bands, (str, Path)):
+        bands = open_band_stack(bands)
+
+    rows, cols = bands.shape[1:]
+    outputs = create_output_rasters(output_dir, (rows, cols))
+
+    for row_slice, col_slice in iter_windows(rows, cols, tile_size):
+        window = np.asarray(bands[:, row_slice, col_slice], dtype=np.float32)
+        result = process_scene(window, endmembers, method)
+        for name in OUTPUT_NAMES:
+            outputs[name][row_slice, col_slice] = result[name]
+
+    for raster in outputs.values():
+        raster.flush()
+
+    if raster_root is not None:
+        FractionRasters.write_scene(raster_root, site, time_start, outputs)
+    return outputs
@@ -0,0 +1,169 @@
+"""
+Per-pixel trend and change-point detection over fraction stacks
+Quantifies degradation and recovery instead of reading it off the
+Figure 3/4 time series by eye
+
+For every pixel of a (T, rows, cols) stack (e.g. Soil or Veg over time):
+- Theil-Sen slope (fraction per year): median of all pairwise slopes
+- Mann-Kendall S, Z and two-sided p-value for a monotonic trend
+- Pettitt change point: break index/date and approximate p-value
+
+All statistics are computed with batched NumPy operations over the
+time-pair axis for a chunk of pixels at a time; chunks are spread over a
+process pool with the stack placed in shared memory. NaN observations
+are left out of the pairs they belong to; gap-fill first (Compositing.py)
+for the most reliable Pettitt breaks.
+"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ParallelUnmixing import attach_array, share_array
+
+# Upper bound on (time pairs x pixels) elements held per chunk
+MAX_PAIR_ELEMENTS = 2 ** 24
+DAYS_PER_YEAR = 365.25
+RESULT_NAMES = ['slope', 'mk_s', 'mk_z', 'mk_p', 'break_index', 'break_p']
+
+
+def _erfc(x):
+    """Vectorised complementary error function (Abramowitz & Stegun 7.1.26)"""
+    x = np.asarray(x, dtype=np.float64)
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741
+                + t * (-1.453152027 + t * 1.061405429))))
+    result = poly * np.exp(-z * z)
+    return np.where(x >= 0, result, 2.0 - result)
+
+
+def analyse_pixels(values, times):
+    """
+    Trend statistics for a (T, P) block of pixel time series
+    times: observation times in days, shape (T,)
+    Returns a dict of (P,) arrays named as RESULT_NAMES.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_times = values.shape[0]
+    i, j = np.triu_indices(n_times, 1)
+
+    # Pairwise differences for all pixels at once: (pairs, P)
+    dy = values[j] - values[i]
+    dt = (times[j] - times[i])[:, None]
+    valid = ~np.isnan(dy)
+    n_valid = (~np.isnan(values)).sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slopes = np.where(valid & (dt > 0), dy / dt, np.nan)
+    # All-NaN pixels give NaN without a warning
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        slope = np.nanmedian(slopes, axis=0) * DAYS_PER_YEAR
+
+    # Mann-Kendall
+    signs = np.sign(np.where(valid, dy, 0.0))
+    s = signs.sum(axis=0)
+    var_s = n_valid * (n_valid - 1) * (2 * n_valid + 5) / 18.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.where(var_s > 0, (s - np.sign(s)) / np.sqrt(var_s), np.nan)
+    p = np.where(np.isnan(z), np.nan, _erfc(np.abs(z) / np.sqrt(2.0)))
+
+    # Pettitt: U_t = U_{t-1} + sum_j sign(x_t - x_j)
+    pair_sign = np.zeros((n_times, n_times) + values.shape[1:])
+    pair_sign[i, j] = -signs
+    pair_sign[j, i] = signs
+    u = np.cumsum(pair_sign.sum(axis=1), axis=0)[:-1]
+    if len(u):
+        k = np.abs(u).max(axis=0)
+        break_index = np.abs(u).argmax(axis=0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            break_p = np.minimum(1.0, 2.0 * np.exp(-6.0 * k ** 2 / (n_valid ** 3 + n_valid ** 2)))
+    else:
+        break_index = np.full(values.shape[1:], np.nan)
+        break_p = np.full(values.shape[1:], np.nan)
+
+    too_short = n_valid < 3
+    for arr in (slope, z, p, break_index, break_p):
+        arr[too_short] = np.nan
+    s = np.where(too_short, np.nan, s)
+
+    return {'slope': slope, 'mk_s': s, 'mk_z': z, 'mk_p': p,
+            'break_index': break_index, 'break_p': break_p}
+
+
+def _analyse_chunk(task):
+    """Worker: analyse pixel columns [start, stop) of a shared (T, P) stack"""
+    spec, times, start, stop = task
+    block, stack = attach_array(spec)
+    try:
+        return analyse_pixels(np.array(stack[:, start:stop]), times)
+    finally:
+        del stack
+        block.close()
+
+
+def analyse_stack(stack, dates, max_workers=None, chunk_pixels=None):
+    """
+    Trend and change-point rasters for a (T, rows, cols) fraction stack
+
+    dates: the T observation dates
+    max_workers: worker processes (1 runs in this process)
+    chunk_pixels: pixels per chunk (by default sized from MAX_PAIR_ELEMENTS)
+
+    Returns a dict of (rows, cols) arrays: slope (per year), Mann-Kendall
+    S/Z/p, Pettitt break_index/break_p, and break_date (datetime64[D], NaT
+    where undefined).
+    """
+    stack = np.asarray(stack, dtype=np.float32)
+    n_times, spatial_shape = stack.shape[0], stack.shape[1:]
+    pixels = stack.reshape(n_times, -1)
+    dates = pd.DatetimeIndex(dates)
+    times = (dates - dates[0]).total_seconds().to_numpy() / 86400.0
+
+    n_pairs = max(n_times * (n_times - 1) // 2, 1)
+    if chunk_pixels is None:
+        chunk_pixels = max(1, MAX_PAIR_ELEMENTS // max(n_pairs, n_times * n_times))
+    bounds = [(start, min(start + chunk_pixels, pixels.shape[1]))
+              for start in range(0, pixels.shape[1], chunk_pixels)]
+    max_workers = max_workers or os.cpu_count() or 1
+
+    if max_workers == 1 or len(bounds) == 1:
+        parts = [analyse_pixels(pixels[:, start:stop], times) for start, stop in bounds]
+    else:
+        block, spec = share_array(pixels)
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                parts = list(executor.map(_analyse_chunk,
+                                          [(spec, times, start, stop) for start, stop in bounds]))
+        finally:
+            block.close()
+            block.unlink()
+
+    result = {name: np.concatenate([part[name] for part in parts]).reshape(spatial_shape)
+              for name in RESULT_NAMES}
+
+    # Break date = last observation before the change
+    index = result['break_index']
+    break_date = np.full(index.shape, np.datetime64('NaT'), dtype='datetime64[D]')
+    defined = ~np.isnan(index)
+    break_date[defined] = dates.to_numpy().astype('datetime64[D]')[index[defined].astype(int)]
+    result['break_date'] = break_date
+
+    return result
+
+
+def write_trend_rasters(output_dir, site, result):
+    """Save each trend raster as <output_dir>/<site>/<name>.npy"""
+    site_dir = Path(output_dir) / site
+    site_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, raster in result.items():
+        path = site_dir / f'{name}.npy'
+        np.save(path, raster)
+        paths.append(path)
+    return paths
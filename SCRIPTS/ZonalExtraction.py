@@ -0,0 +1,310 @@
+"""
+Zonal extraction of Soil/Veg/Shadow/RMSE time series for many parcels
+Scales the three 2 km site buffers of GEE_Script.js to thousands of farm
+and grazing parcels, with one pass over each scene for all of them
+
+Inputs:
+- Parcel polygons as GeoJSON (Polygon / MultiPolygon features) in the
+  coordinate system of the scene grid
+- Scenes as band stacks <scenes>/<Tile>/<YYYY-MM-DD>.npy (6, rows, cols)
+  in BAND_ORDER, with the tile's north-up grid in <scenes>/<Tile>/grid.json:
+  {"transform": [x_origin, pixel_width, y_origin, pixel_height]}
+- The EndmemberLibrary holding each tile's endmembers
+
+Outputs:
+- One normalised table per parcel (system:time_start, Soil, Veg, Shadow,
+  RMSE; DataIngestion format) as <parcel>.csv and/or FractionStore sites
+
+The parcels are rasterised once per tile into a label grid (0 outside
+every parcel, i + 1 inside parcel i; pixel centres inside the polygon,
+even-odd rule for holes; where parcels overlap the later one wins). Each
+scene is then read window by window, only the labelled pixels are
+unmixed, and the per-parcel sums and valid-pixel counts of all four
+outputs come from a single bincount per window. Parcels spanning several
+tiles are averaged over all their pixels.
+
+Usage:
+    python ZonalExtraction.py --parcels parcels.geojson --scenes SCENES \\
+        --library endmembers.json --output PARCEL_TABLES
+    python ZonalExtraction.py --parcels parcels.geojson --id-property parcel_id \\
+        --scenes SCENES --library endmembers.json --store STORE --method fcls
+"""
+
+import argparse
+import json
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import FractionStore
+from DataIngestion import TIME_COLUMN, VALUE_COLUMNS, write_normalised_tables
+from EndmemberLibrary import EndmemberLibrary
+from LocalUnmixing import UNMIX_METHODS, process_scene
+from StreamingAppend import pending_scenes
+from TiledUnmixing import DEFAULT_TILE_SIZE, OUTPUT_NAMES, iter_windows, open_band_stack
+
+GRID_FILE = 'grid.json'
+BACKGROUND = 0
+
+# North-up affine grid: x = x_origin + col * pixel_width, y = y_origin + row * pixel_height
+GridTransform = namedtuple('GridTransform', ['x_origin', 'pixel_width', 'y_origin', 'pixel_height'])
+
+Parcel = namedtuple('Parcel', ['parcel_id', 'polygons'])
+
+# Labelled pixels of one window: flat indices into the window and parcel labels
+LabelledWindow = namedtuple('LabelledWindow', ['rows', 'cols', 'index', 'labels'])
+
+
+def load_grid(tile_dir):
+    """Grid transform of a tile from its grid.json"""
+    spec = json.loads((Path(tile_dir) / GRID_FILE).read_text())
+    return GridTransform(*map(float, spec['transform']))
+
+
+def read_parcels(path, id_property=None):
+    """
+    Read Polygon / MultiPolygon features from a GeoJSON file
+    Parcel ids come from properties[id_property], else the feature 'id',
+    else the feature's position. Returns a list of Parcel(parcel_id, polygons)
+    with each polygon a list of rings (exterior first, then holes).
+    """
+    features = json.loads(Path(path).read_text())['features']
+    parcels, seen = [], set()
+
+    for position, feature in enumerate(features):
+        if id_property is not None:
+            parcel_id = feature['properties'][id_property]
+        else:
+            parcel_id = feature.get('id', position)
+        parcel_id = str(parcel_id)
+        if parcel_id in seen:
+            raise ValueError(f"{path}: duplicate parcel id '{parcel_id}'")
+        if '/' in parcel_id or '\\' in parcel_id:
+            raise ValueError(f"{path}: parcel id '{parcel_id}' cannot be used as a site name")
+        seen.add(parcel_id)
+
+        geometry = feature['geometry']
+        if geometry['type'] == 'Polygon':
+            polygons = [geometry['coordinates']]
+        elif geometry['type'] == 'MultiPolygon':
+            polygons = geometry['coordinates']
+        else:
+            raise ValueError(f"{path}: parcel '{parcel_id}' is a {geometry['type']}, "
+                             "expected Polygon or MultiPolygon")
+        parcels.append(Parcel(parcel_id, polygons))
+
+    return parcels
+
+
+def _ranges(starts, lengths):
+    """Concatenated aranges [start, start + length) as one array"""
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets
+
+
+def _ring_crossings(ring, transform, n_rows):
+    """(row, column) positions where a ring's edges cross the pixel-centre scanlines"""
+    ring = np.asarray(ring, dtype=np.float64)
+    u = (ring[:, 0] - transform.x_origin) / transform.pixel_width
+    v = (ring[:, 1] - transform.y_origin) / transform.pixel_height
+    u1, v1 = np.roll(u, -1), np.roll(v, -1)
+
+    # Half-open rule: an edge crosses scanline r when min(v) <= r + 0.5 < max(v),
+    # so every row sees an even number of crossings; horizontal edges see none
+    first = np.clip(np.ceil(np.minimum(v, v1) - 0.5), 0, n_rows).astype(np.int64)
+    stop = np.clip(np.ceil(np.maximum(v, v1) - 0.5), 0, n_rows).astype(np.int64)
+    counts = stop - first
+
+    edge = np.repeat(np.arange(len(u)), counts)
+    rows = _ranges(first, counts)
+    t = (rows + 0.5 - v[edge]) / (v1[edge] - v[edge])
+    return rows, u[edge] + t * (u1[edge] - u[edge])
+
+
+def polygon_pixels(rings, transform, shape):
+    """Row and column indices of the pixels whose centres fall inside a polygon"""
+    n_rows, n_cols = shape
+    crossings = [_ring_crossings(ring, transform, n_rows) for ring in rings]
+    rows = np.concatenate([r for r, _ in crossings])
+    cols = np.concatenate([c for _, c in crossings])
+
+    # Even-odd rule: consecutive crossings on a scanline bound the inside spans
+    order = np.lexsort((cols, rows))
+    rows, cols = rows[order][0::2], cols[order]
+    start = np.clip(np.ceil(cols[0::2] - 0.5), 0, n_cols).astype(np.int64)
+    stop = np.clip(np.ceil(cols[1::2] - 0.5), 0, n_cols).astype(np.int64)
+    lengths = np.maximum(stop - start, 0)
+
+    return np.repeat(rows, lengths), _ranges(start, lengths)
+
+
+def rasterise_parcels(parcels, transform, shape):
+    """
+    Burn parcels into a label grid: 0 outside every parcel, i + 1 inside
+    parcels[i]. The dtype is the smallest unsigned type holding the labels.
+    """
+    labels = np.zeros(shape, dtype=np.min_scalar_type(len(parcels)))
+    for label, parcel in enumerate(parcels, start=1):
+        for rings in parcel.polygons:
+            rows, cols = polygon_pixels(rings, transform, shape)
+            labels[rows, cols] = label
+    return labels
+
+
+def index_labels(labels, tile_size=DEFAULT_TILE_SIZE):
+    """Split a label grid into the windows that contain parcel pixels"""
+    windows = []
+    for row_slice, col_slice in iter_windows(*labels.shape, tile_size):
+        window = labels[row_slice, col_slice].ravel()
+        index = np.flatnonzero(window != BACKGROUND)
+        if index.size:
+            windows.append(LabelledWindow(row_slice, col_slice, index, window[index]))
+    return windows
+
+
+def zonal_sums(bands, windows, endmembers, n_parcels, method='gee'):
+    """
+    Per-parcel sums and valid-pixel counts of Soil/Veg/Shadow/RMSE for a scene
+    Only the labelled pixels of each window are unmixed; the four outputs
+    are reduced together with one bincount over (output, label) keys.
+    Returns (sums, counts), each of shape (4, n_parcels + 1); column 0 is
+    the background and stays empty.
+    """
+    size = n_parcels + 1
+    offsets = (np.arange(len(OUTPUT_NAMES)) * size)[:, None]
+    sums = np.zeros(len(OUTPUT_NAMES) * size)
+    counts = np.zeros(len(OUTPUT_NAMES) * size, dtype=np.int64)
+
+    for window in windows:
+        block = np.asarray(bands[:, window.rows, window.cols], dtype=np.float32)
+        pixels = block.reshape(block.shape[0], -1)[:, window.index]
+        result = process_scene(pixels, endmembers, method)
+
+        values = np.stack([result[name] for name in OUTPUT_NAMES])
+        valid = ~np.isnan(values)
+        keys = (window.labels.astype(np.int64) + offsets)[valid]
+        sums += np.bincount(keys, weights=values[valid], minlength=sums.size)
+        counts += np.bincount(keys, minlength=counts.size)
+
+    shape = (len(OUTPUT_NAMES), size)
+    return sums.reshape(shape), counts.reshape(shape)
+
+
+def extract_parcels(parcels, scenes_dir, library, tiles=None, method='gee',
+                    tile_size=DEFAULT_TILE_SIZE):
+    """
+    Per-parcel region-mean time series over every tile's scenes
+
+    library: EndmemberLibrary; each tile's most recent endmember set is used
+    tiles: tile directories to read (default: every directory under scenes_dir)
+
+    Returns {parcel_id: normalised table}; parcels outside every tile are
+    left out, cloud-covered dates of a parcel are kept as NaN rows.
+    """
+    if tiles is None:
+        tiles = sorted(path.name for path in Path(scenes_dir).iterdir() if path.is_dir())
+
+    n_parcels = len(parcels)
+    totals = {}
+    for tile in tiles:
+        scenes = pending_scenes(scenes_dir, tile)
+        if not scenes:
+            continue
+        endmembers = library.latest_for_site(tile)
+        if endmembers is None:
+            raise ValueError(f"No stored endmembers for tile '{tile}'; "
+                             "build them with EndmemberLibrary.endmembers_for first")
+
+        transform = load_grid(Path(scenes_dir) / tile)
+        first = open_band_stack(scenes[0][1])
+        labels = rasterise_parcels(parcels, transform, first.shape[1:])
+        windows = index_labels(labels, tile_size)
+        del labels
+        if not windows:
+            continue
+        present = np.zeros(n_parcels + 1, dtype=bool)
+        for window in windows:
+            present[window.labels] = True
+
+        for date, path in scenes:
+            sums, counts = zonal_sums(open_band_stack(path), windows, endmembers,
+                                      n_parcels, method)
+            total = totals.setdefault(date, [np.zeros_like(sums), np.zeros_like(counts),
+                                             np.zeros(n_parcels + 1, dtype=bool)])
+            total[0] += sums
+            total[1] += counts
+            total[2] |= present
+
+    tables = {}
+    if not totals:
+        return tables
+
+    dates = sorted(totals)
+    sums = np.stack([totals[date][0] for date in dates])
+    counts = np.stack([totals[date][1] for date in dates])
+    present = np.stack([totals[date][2] for date in dates])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+
+    times = pd.DatetimeIndex(dates)
+    for label, parcel in enumerate(parcels, start=1):
+        rows = present[:, label]
+        if not rows.any():
+            continue
+        table = pd.DataFrame(means[rows, :, label], columns=OUTPUT_NAMES)
+        table.insert(0, TIME_COLUMN, times[rows])
+        tables[parcel.parcel_id] = table[[TIME_COLUMN] + VALUE_COLUMNS]
+
+    return tables
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--parcels', type=Path, required=True,
+                        help='GeoJSON file of parcel polygons in the scene grid coordinates')
+    parser.add_argument('--id-property', default=None,
+                        help="feature property holding the parcel id (default: feature 'id')")
+    parser.add_argument('--scenes', type=Path, required=True,
+                        help='directory of scenes, <Tile>/<YYYY-MM-DD>.npy plus <Tile>/grid.json')
+    parser.add_argument('--library', type=Path, required=True,
+                        help='EndmemberLibrary JSON file with the tiles\' endmembers')
+    parser.add_argument('--tiles', nargs='+', default=None,
+                        help='tiles to read (default: all tile directories in --scenes)')
+    parser.add_argument('--method', choices=UNMIX_METHODS, default='gee',
+                        help="unmixing method: 'gee' clamp-and-normalise or exact 'fcls'")
+    parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE,
+                        help=f'window size for reading scenes (default: {DEFAULT_TILE_SIZE})')
+    parser.add_argument('--output', type=Path, default=None,
+                        help='write one normalised <parcel>.csv per parcel here')
+    parser.add_argument('--store', type=Path, default=None,
+                        help='upsert the parcel series into this FractionStore')
+    args = parser.parse_args(argv)
+    if args.output is None and args.store is None:
+        parser.error('at least one of --output or --store is required')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    parcels = read_parcels(args.parcels, args.id_property)
+    tables = extract_parcels(parcels, args.scenes, EndmemberLibrary(args.library),
+                             args.tiles, args.method, args.tile_size)
+    if not tables:
+        print(f"✗ No parcel of {args.parcels} intersects the scenes in {args.scenes}")
+        return 1
+
+    if args.output is not None:
+        write_normalised_tables(tables, args.output)
+        print(f"✓ Saved: {len(tables)} parcel tables to {args.output}")
+    if args.store is not None:
+        for parcel_id, table in tables.items():
+            FractionStore.write_site_table(args.store, parcel_id, table)
+        print(f"✓ Stored: {len(tables)} parcels in {args.store}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())